@@ -0,0 +1,106 @@
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from typing import List
+from migrate_schema import migrate, schema_version
+
+
+def sample_paths(conn: sqlite3.Connection, samples: int, seed: int = 0) -> List[List[str]]:
+    """Pick random nodes and rebuild the move path leading to each of them."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT MAX(id) FROM Moves")
+    max_id = cursor.fetchone()[0] or 0
+    rng = random.Random(seed)
+    paths = []
+    while len(paths) < samples and max_id:
+        cursor.execute("SELECT id, parent_id, move FROM Moves WHERE id = ?", (rng.randint(1, max_id),))
+        row = cursor.fetchone()
+        if not row:
+            continue
+        path = []
+        while row:
+            path.append(row[2])
+            if row[1] is None:
+                break
+            cursor.execute("SELECT id, parent_id, move FROM Moves WHERE id = ?", (row[1],))
+            row = cursor.fetchone()
+        paths.append(path[::-1])
+    return paths
+
+
+V1_LOOKUP_SQL = """
+    SELECT id, white_win_count, black_win_count,
+           draw_count, unfinished_count
+    FROM Moves
+    WHERE move = ? AND parent_id IS ?
+"""
+
+# From v3 on Moves.move is a MoveDict code
+LOOKUP_SQL = """
+    SELECT id, white_win_count, black_win_count,
+           draw_count, unfinished_count
+    FROM Moves
+    WHERE move = (SELECT code FROM MoveDict WHERE san = ?) AND parent_id IS ?
+"""
+
+
+def time_lookups(db_path: str, paths: List[List[str]], sql: str) -> float:
+    """Resolve every path ply by ply, the way get_statistics does, and return the elapsed seconds."""
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.cursor()
+        start = time.perf_counter()
+        for path in paths:
+            parent_id = None
+            for move in path:
+                cursor.execute(sql, (move, parent_id))
+                parent_id = cursor.fetchone()[0]
+        return time.perf_counter() - start
+
+
+def query_plan(db_path: str, sql: str) -> str:
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("EXPLAIN QUERY PLAN " + sql, ('e4', None)).fetchall()
+    return "; ".join(row[-1] for row in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare path lookups on a v1 database and its migrated copy.")
+    parser.add_argument('db_path', nargs='?', default='chess_game_data.db')
+    parser.add_argument('--samples', type=int, default=200, help="number of random paths to look up")
+    args = parser.parse_args()
+
+    with sqlite3.connect(args.db_path) as conn:
+        if schema_version(conn) != 1:
+            raise SystemExit(f"{args.db_path} is already migrated; pass an unmigrated (v1) database")
+        paths = sample_paths(conn, args.samples)
+    plies = sum(len(path) for path in paths)
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        migrated = os.path.join(temp_dir, 'migrated.db')
+        shutil.copyfile(args.db_path, migrated)
+        migrate(migrated)
+
+        print(f"v1 plan:       {query_plan(args.db_path, V1_LOOKUP_SQL)}")
+        print(f"migrated plan: {query_plan(migrated, LOOKUP_SQL)}")
+
+        old_size = os.path.getsize(args.db_path)
+        new_size = os.path.getsize(migrated)
+        old_seconds = time_lookups(args.db_path, paths, V1_LOOKUP_SQL)
+        new_seconds = time_lookups(migrated, paths, LOOKUP_SQL)
+    finally:
+        shutil.rmtree(temp_dir)
+
+    print(f"\nsize: v1 {old_size / 2**20:.1f} MiB, migrated {new_size / 2**20:.1f} MiB")
+    print(f"{len(paths)} paths, {plies} ply lookups")
+    print(f"v1:       {old_seconds:.3f}s ({old_seconds / plies * 1e6:.1f} us/lookup)")
+    print(f"migrated: {new_seconds:.3f}s ({new_seconds / plies * 1e6:.1f} us/lookup)")
+    print(f"speedup:  {old_seconds / new_seconds:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
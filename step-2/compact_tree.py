@@ -0,0 +1,145 @@
+import argparse
+import sqlite3
+from typing import Optional
+from move_dictionary import MoveDictionary, OTHER_MOVE
+from positions import rebuild_positions
+from sqlite_db_creation import enable_wal, bump_tree_version
+
+
+def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                        (name,)).fetchone() is not None
+
+
+def prune_max_ply(conn: sqlite3.Connection, max_ply: int):
+    """
+    Delete every node more than max_ply moves deep (in the caller's transaction).
+    Counts at the cut-off ply are untouched, so nothing needs folding.
+    Positions is rebuilt from the remaining tree.
+    """
+    conn.execute("DROP TABLE IF EXISTS temp.kept_moves")
+    conn.execute("""
+        CREATE TEMP TABLE kept_moves AS
+        WITH RECURSIVE kept(id, ply) AS (
+            SELECT id, 1 FROM Moves WHERE parent_id IS NULL
+            UNION ALL
+            SELECT m.id, kept.ply + 1 FROM Moves m JOIN kept ON m.parent_id = kept.id
+            WHERE kept.ply < ?
+        )
+        SELECT id FROM kept
+    """, (max_ply,))
+    conn.execute("DELETE FROM Moves WHERE id NOT IN (SELECT id FROM temp.kept_moves)")
+    conn.execute("DROP TABLE temp.kept_moves")
+    if _has_table(conn, 'Positions'):
+        rebuild_positions(conn)
+
+
+def prune_min_count(conn: sqlite3.Connection, min_count: int):
+    """
+    Delete every node played in fewer than min_count games (in the caller's
+    transaction). The counts of a kept parent's pruned children are added to
+    its OTHER_MOVE child, so the children's totals still add up; pruned
+    subtrees need no folding of their own, as a child never has more games
+    than its parent. Positions reached in fewer than min_count games are
+    dropped too.
+
+    Every pruned move was played less often than every kept sibling, so the
+    kept moves' sibling_rank stays valid; the new buckets are unranked.
+    """
+    other = MoveDictionary(conn).encode(OTHER_MOVE)
+
+    # Counts of the topmost pruned nodes, per kept parent (NULL for first moves)
+    conn.execute("DROP TABLE IF EXISTS temp.folded_moves")
+    conn.execute("""
+        CREATE TEMP TABLE folded_moves AS
+        SELECT m.parent_id AS parent_id,
+               SUM(m.white_win_count) AS white_win_count,
+               SUM(m.black_win_count) AS black_win_count,
+               SUM(m.draw_count) AS draw_count,
+               SUM(m.unfinished_count) AS unfinished_count
+        FROM Moves m LEFT JOIN Moves p ON p.id = m.parent_id
+        WHERE m.total < :min_count AND m.move != :other
+          AND (m.parent_id IS NULL OR p.total >= :min_count)
+        GROUP BY m.parent_id
+    """, {'min_count': min_count, 'other': other})
+
+    # Add them to the parent's existing bucket, or create one
+    conn.execute("""
+        UPDATE Moves SET
+            white_win_count = Moves.white_win_count + f.white_win_count,
+            black_win_count = Moves.black_win_count + f.black_win_count,
+            draw_count = Moves.draw_count + f.draw_count,
+            unfinished_count = Moves.unfinished_count + f.unfinished_count
+        FROM temp.folded_moves f
+        WHERE Moves.parent_id IS f.parent_id AND Moves.move = ?
+    """, (other,))
+    conn.execute("""
+        INSERT INTO Moves (parent_id, move, white_win_count, black_win_count,
+                           draw_count, unfinished_count)
+        SELECT f.parent_id, :other, f.white_win_count, f.black_win_count,
+               f.draw_count, f.unfinished_count
+        FROM temp.folded_moves f
+        WHERE NOT EXISTS (SELECT 1 FROM Moves WHERE parent_id IS f.parent_id AND move = :other)
+    """, {'other': other})
+    conn.execute("DROP TABLE temp.folded_moves")
+
+    conn.execute("DELETE FROM Moves WHERE total < ? AND move != ?", (min_count, other))
+    # Buckets are leaves, so the only orphans left are buckets of pruned nodes
+    conn.execute("""
+        DELETE FROM Moves
+        WHERE move = ? AND parent_id IS NOT NULL AND parent_id NOT IN (SELECT id FROM Moves)
+    """, (other,))
+
+    if _has_table(conn, 'Positions'):
+        conn.execute("DELETE FROM Positions WHERE total < ?", (min_count,))
+
+
+def compact(db_path: str, min_count: Optional[int] = None, max_ply: Optional[int] = None,
+            vacuum: bool = True):
+    """Prune an existing database in place, as a single transaction, and VACUUM it."""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    enable_wal(conn)
+    try:
+        before = conn.execute("SELECT COUNT(*) FROM Moves").fetchone()[0]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Depth first: Positions is rebuilt from the depth-limited tree,
+            # which has to happen before any counts are folded away
+            if max_ply is not None:
+                print(f"Pruning moves deeper than ply {max_ply}...")
+                prune_max_ply(conn, max_ply)
+            if min_count is not None:
+                print(f"Pruning moves played in fewer than {min_count} games...")
+                prune_min_count(conn, min_count)
+            if _has_table(conn, 'TreeVersion'):
+                bump_tree_version(conn)  # Readers must drop the nodes they cached
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        after = conn.execute("SELECT COUNT(*) FROM Moves").fetchone()[0]
+        print(f"Moves: {before} -> {after} rows")
+
+        if vacuum:
+            # Give the freed pages back to the file system
+            print("Vacuuming...")
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prune rarely played and deep moves from a chess game database.")
+    parser.add_argument('db_path', nargs='?', default='chess_game_data.db')
+    parser.add_argument('--min-count', type=int, help="drop moves played in fewer games, folding them into '<other>'")
+    parser.add_argument('--max-ply', type=int, help="drop moves deeper than this ply")
+    parser.add_argument('--no-vacuum', action='store_true', help="skip the final VACUUM")
+    args = parser.parse_args()
+    if args.min_count is None and args.max_ply is None:
+        parser.error("nothing to do: pass --min-count and/or --max-ply")
+
+    compact(args.db_path, min_count=args.min_count, max_ply=args.max_ply, vacuum=not args.no_vacuum)
+
+
+if __name__ == "__main__":
+    main()
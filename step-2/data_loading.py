@@ -1,21 +1,65 @@
+import os
 import sqlite3
+from contextlib import closing
+from multiprocessing import Pool
 from tqdm import tqdm
 from typing import List, Tuple, Optional
+import chess
+from move_trie import MoveTrie, RESULT_INDEX
+from move_dictionary import MoveDictionary
+from parallel_ingest import split_byte_ranges, build_chunk
+from external_sort_ingest import ExternalTreeBuilder
+from pgn_reader import open_pgn, iter_pgn_games, game_hash
+from positions import PositionCounter, game_position_keys, position_key, fen_key, rebuild_positions
+from compact_tree import prune_min_count
+from sibling_ranks import update_sibling_ranks
+from sqlite_db_creation import INGESTCHECKPOINT_TABLE_SQL, enable_wal, bump_tree_version
 
 class ChessDatabase:
-    def __init__(self, db_path: str, batch_size: int = 1000):
+    def __init__(self, db_path: str, batch_size: int = 1000, chunk_size: int = 200000,
+                 memory_limit_mb: int = 1024, track_positions: bool = True,
+                 max_ply: Optional[int] = None, min_count: Optional[int] = None):
         self.db_path = db_path
         self.batch_size = batch_size  # Batching size for better performance
+        self.chunk_size = chunk_size  # Games aggregated in memory per flush in 'trie' mode
+        self.memory_limit_mb = memory_limit_mb  # RAM ceiling for the 'external' engine
+        self.track_positions = track_positions  # Also count results per position in Positions
+        self.max_ply = max_ply  # Only store the first max_ply moves of each game
+        self.min_count = min_count  # Prune moves played in fewer games once a file is loaded
         self.move_count = 0  # To keep track of moves processed in the current batch
+        self.checkpoint = None  # (source, byte_offset, games_done) to record with the next commit
+        self.move_dict = None  # MoveDictionary of the connection being written to
+        self.touched_parents = set()  # Nodes whose children changed since the last commit; None for all
+        self.versioned = False  # Whether the database has a TreeVersion counter to bump on commit
 
-    def insert_move(self, conn: sqlite3.Connection, move_sequence: List[str], result: str):
-        """Insert or update a move sequence and update stats at each level."""
+    def _move_dictionary(self, conn: sqlite3.Connection) -> MoveDictionary:
+        """SAN <-> code mapping for conn, loaded once per connection."""
+        if self.move_dict is None or self.move_dict.conn is not conn:
+            self.move_dict = MoveDictionary(conn)
+        return self.move_dict
+
+    def insert_move(self, conn: sqlite3.Connection, move_sequence: List[str], result: str,
+                    game_key: Optional[bytes] = None):
+        """
+        Insert or update a move sequence and update stats at each level.
+        game_key (see pgn_reader.game_hash) is recorded in GameHashes along with the game.
+        """
         cursor = conn.cursor()
+        move_dict = self._move_dictionary(conn)
         parent_id = None
+        path_ids = []
 
+        # A savepoint per game, so a failing game is undone on its own
+        # instead of rolling back the rest of the uncommitted batch. It has to sit
+        # inside the batch transaction, otherwise RELEASE would commit every game.
+        if not conn.in_transaction:
+            cursor.execute("BEGIN")
+        cursor.execute("SAVEPOINT game")
         try:
             # Loop through each move in the sequence
-            for move in move_sequence:
+            for san in move_sequence:
+                move = move_dict.encode(san)  # Moves stores the MoveDict code
+
                 # Check if move already exists in the database
                 cursor.execute("""
                     SELECT id FROM Moves WHERE move = ? AND parent_id IS ?
@@ -37,24 +81,81 @@ class ChessDatabase:
                 self._update_statistics(cursor, move_id, result)
                 
                 # Move to the next level in the tree
+                path_ids.append(parent_id)
                 parent_id = move_id
 
+            # Count the result once for every distinct position the game reached
+            if self.track_positions:
+                counts = [0, 0, 0, 0]
+                counts[RESULT_INDEX.get(result, 3)] = 1
+                positions = PositionCounter()
+                for key in game_position_keys(move_sequence):
+                    positions.add(key, counts)
+                positions.flush(conn)
+
             # Record the game result in the GameStats table
             cursor.execute("""
                 INSERT INTO GameStats (result) VALUES (?);
             """, (result,))
+            if game_key is not None:
+                self._record_game(conn, game_key)
 
+            cursor.execute("RELEASE SAVEPOINT game")
             self.move_count += 1
-
-            # Commit transaction after every batch
-            if self.move_count % self.batch_size == 0:
-                conn.commit()
-                self.move_count = 0  # Reset move count after batch commit
+            self.touched_parents.update(path_ids)
 
         except Exception as e:
-            conn.rollback()
+            cursor.execute("ROLLBACK TO SAVEPOINT game")
+            cursor.execute("RELEASE SAVEPOINT game")
+            move_dict.reload()  # Forget moves the rollback removed from MoveDict
             raise Exception(f"Error inserting move sequence: {e}")
 
+        # Commit transaction after every batch
+        if self.move_count % self.batch_size == 0:
+            self._commit(conn)
+            self.move_count = 0  # Reset move count after batch commit
+
+    def _commit(self, conn: sqlite3.Connection):
+        """
+        Commit the current batch together with the ingest checkpoint it reaches.
+        Batches only ever end between games, so readers see whole games or none.
+        """
+        if self.touched_parents is None or self.touched_parents:
+            # Re-rank the siblings whose counts changed, before the batch becomes visible
+            update_sibling_ranks(conn, self.touched_parents)
+            self.touched_parents = set()
+        if self.versioned:
+            bump_tree_version(conn)
+        if self.checkpoint is not None:
+            conn.execute("""
+                INSERT OR REPLACE INTO IngestCheckpoint (source, byte_offset, games_done)
+                VALUES (?, ?, ?)
+            """, self.checkpoint)
+        conn.commit()
+
+    @staticmethod
+    def _is_loaded(conn: sqlite3.Connection, game_key: bytes) -> bool:
+        """Whether a game with this hash is already in the database (or the uncommitted batch)."""
+        return conn.execute("SELECT 1 FROM GameHashes WHERE hash = ?", (game_key,)).fetchone() is not None
+
+    @staticmethod
+    def _record_game(conn: sqlite3.Connection, game_key: bytes):
+        # OR IGNORE: outside append mode a game repeated in the dump is counted every time
+        conn.execute("INSERT OR IGNORE INTO GameHashes (hash) VALUES (?)", (game_key,))
+
+    @staticmethod
+    def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+        return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                            (name,)).fetchone() is not None
+
+    @staticmethod
+    def _load_checkpoint(conn: sqlite3.Connection, source: str) -> Tuple[int, int]:
+        """Return (byte_offset, games_done) of the last committed batch for a source file."""
+        row = conn.execute("""
+            SELECT byte_offset, games_done FROM IngestCheckpoint WHERE source = ?
+        """, (source,)).fetchone()
+        return row if row else (0, 0)
+
     def _update_statistics(self, cursor: sqlite3.Cursor, move_id: int, result: str):
         """Update statistics for a single move."""
         if move_id is None:
@@ -91,7 +192,7 @@ class ChessDatabase:
                     SELECT id, white_win_count, black_win_count, 
                            draw_count, unfinished_count
                     FROM Moves 
-                    WHERE move = ? AND parent_id IS ?
+                    WHERE move = (SELECT code FROM MoveDict WHERE san = ?) AND parent_id IS ?
                 """, (move, parent_id))
 
                 row = cursor.fetchone()
@@ -101,46 +202,286 @@ class ChessDatabase:
 
                 parent_id = row[0]
                 
-            total_games = sum(row[1:])
-            if total_games == 0:
-                return {
-                    'white_win_rate': 0,
-                    'black_win_rate': 0,
-                    'draw_rate': 0,
-                    'unfinished_rate': 0,
-                    'total_games': 0
-                }
+            return self._statistics_dict(row[1:])
+
+    def get_statistics_by_board(self, board: chess.Board) -> Optional[dict]:
+        """
+        Get statistics for a position, summed over every move order that
+        reaches it, with a single Positions lookup.
+        """
+        return self._position_statistics(position_key(board))
 
+    def get_statistics_by_fen(self, fen: str) -> Optional[dict]:
+        """Get statistics for the position of a FEN string (see get_statistics_by_board)."""
+        return self._position_statistics(fen_key(fen))
+
+    def _position_statistics(self, key: int) -> Optional[dict]:
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute("""
+                SELECT white_win_count, black_win_count, draw_count, unfinished_count
+                FROM Positions
+                WHERE zobrist = ?
+            """, (key,)).fetchone()
+        if not row:
+            return None
+        return self._statistics_dict(row)
+
+    @staticmethod
+    def _statistics_dict(counts) -> dict:
+        total_games = sum(counts)
+        if total_games == 0:
             return {
-                'white_win_rate': row[1],
-                'black_win_rate': row[2],
-                'draw_rate': row[3],
-                'unfinished_rate': row[4],
-                'total_games': total_games
+                'white_win_rate': 0,
+                'black_win_rate': 0,
+                'draw_rate': 0,
+                'unfinished_rate': 0,
+                'total_games': 0
             }
 
-    def process_pgn_file(self, pgn_file: str):
-        """Process a PGN file and insert moves."""
-        with sqlite3.connect(self.db_path) as conn:
-            # Get total number of lines in the file for the progress bar
-            total_lines = sum(1 for _ in open(pgn_file))
-            with open(pgn_file, 'r') as file:
-                with tqdm(total=total_lines, desc="Processing PGN") as pbar:
-                    for line_num, line in enumerate(file):
-                        line = line.strip()
-                        if line:
-                            try:
-                                moves, result = self._parse_pgn_line(line)
-                                self.insert_move(conn, moves, result)
-                            except Exception as e:
-                                # Log errors with line numbers in error_log.txt
-                                with open("error_log.txt", "a") as log_file:
-                                    log_file.write(f"Error processing line {line_num + 1}: {line}. Error: {e}\n")
-                                continue
-                        pbar.update(1)  # Update progress bar
+        return {
+            'white_win_rate': counts[0],
+            'black_win_rate': counts[1],
+            'draw_rate': counts[2],
+            'unfinished_rate': counts[3],
+            'total_games': total_games
+        }
 
-            # Final commit after processing all moves
+    def process_pgn_file(self, pgn_file: str, engine: str = 'per_move', workers: Optional[int] = None,
+                         raw_pgn: bool = False, resume: bool = True, append: bool = False):
+        """
+        Process a PGN file and insert moves.
+
+        By default pgn_file is the one-game-per-line output of the commands.txt
+        pipeline. With raw_pgn=True it is read directly as (optionally .gz/.bz2/.xz
+        compressed) PGN through pgn_reader, without any intermediate files.
+
+        engine='per_move' updates the tree one ply at a time through insert_move.
+        engine='trie' aggregates `chunk_size` games in an in-memory prefix tree and
+        flushes them with executemany.
+        engine='parallel' builds the per-chunk trees in `workers` processes over byte
+        ranges of the file and merges them in the parent (formatted input only).
+        All of these produce identical Moves/GameStats rows.
+        engine='external' builds an empty Moves table from sorted spill runs within
+        `memory_limit_mb`; counts are identical but ids are assigned level by level.
+
+        The database is switched to WAL mode, so step3 readers can keep working
+        while a file is loaded; each commit (a whole number of games, the sibling
+        ranks they change and a TreeVersion bump) becomes visible to them at once.
+
+        Every commit also stores how far into pgn_file it got in the IngestCheckpoint
+        table, in the same transaction. With resume=True a restarted run continues
+        after the last committed game instead of counting games twice.
+
+        With track_positions the Positions table is filled in the same
+        transactions. This replays every game with python-chess, which costs
+        more than the tree update itself; it can be switched off and the table
+        rebuilt later with positions.rebuild_positions.
+
+        Every raw PGN load records each game's hash (moves, result and Seven Tag
+        Roster) in GameHashes. append=True is for loading a new dump on top of an
+        existing database: games whose hash is already there, i.e. loaded from an
+        earlier, overlapping raw dump, are skipped, so only the new games' paths
+        are touched. It needs raw PGN input, as the formatted files have no tags
+        to tell identical games apart, and an engine that updates an existing
+        tree ('external' only builds an empty one).
+
+        max_ply cuts every game off after that many moves. With min_count, moves
+        played in fewer games are pruned once the file is loaded and their counts
+        folded into a per-parent '<other>' move, like compact_tree.py does for an
+        existing database. A later load that reaches a pruned move starts it
+        afresh; the next prune folds it into '<other>' again.
+        """
+        if engine not in ('per_move', 'trie', 'external', 'parallel'):
+            raise ValueError(f"Unknown ingest engine: {engine}")
+        if engine == 'parallel' and raw_pgn:
+            raise ValueError("The parallel engine needs the formatted one-game-per-line file")
+        if append and not raw_pgn:
+            raise ValueError("Append mode needs raw PGN input (raw_pgn=True) to identify games by their tags")
+        if append and engine == 'external':
+            raise ValueError("The external engine only builds an empty Moves table; append with 'per_move' or 'trie'")
+
+        source = os.path.abspath(pgn_file)
+        # Closing the connection at the end (rather than only committing) folds
+        # the write-ahead log back into the database file
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            enable_wal(conn)
+            self.versioned = self._has_table(conn, 'TreeVersion')
+            if self.track_positions and not self._has_table(conn, 'Positions'):
+                raise ValueError(f"{self.db_path} has no Positions table; upgrade it with migrate_schema.py")
+            record_games = raw_pgn and self._has_table(conn, 'GameHashes')
+            if append and not record_games:
+                raise ValueError(f"{self.db_path} has no GameHashes table; upgrade it with migrate_schema.py")
+            # Every commit records a checkpoint, resumed or not; databases from
+            # before schema v8 only get the table here
+            conn.execute(INGESTCHECKPOINT_TABLE_SQL)
             conn.commit()
+            start_offset, start_games = self._load_checkpoint(conn, source) if resume else (0, 0)
+            # A raw file's offset is the reader's (read-ahead) position, so only
+            # formatted input can tell it's done from the offset alone
+            if not raw_pgn and start_offset >= os.path.getsize(pgn_file) > 0:
+                print(f"{pgn_file} is already loaded into {self.db_path}")
+                return
+            if engine == 'parallel':
+                return self._process_pgn_file_parallel(conn, source, workers or os.cpu_count() or 1, start_offset)
+
+            trie = MoveTrie() if engine == 'trie' else None
+            builder = None  # ExternalTreeBuilder, created at the first game so a finished file loads nothing
+
+            # Position just after the last game read, recorded with each commit
+            position = {'byte_offset': start_offset, 'games_done': start_games}
+            if raw_pgn:
+                games = self._iter_raw_games(pgn_file, position)
+            else:
+                games = self._iter_formatted_games(pgn_file, position)
+            duplicates = 0
+            for location, text, moves, result, tags in games:
+                self.checkpoint = (source, position['byte_offset'], position['games_done'])
+                game_key = game_hash(moves, result, tags) if record_games else None
+                if append and self._is_loaded(conn, game_key):
+                    duplicates += 1
+                    continue
+                if self.max_ply is not None:
+                    moves = moves[:self.max_ply]
+                if engine == 'external' and builder is None:
+                    builder = ExternalTreeBuilder(conn, self.memory_limit_mb * 1024 * 1024)
+                try:
+                    if trie is not None:
+                        trie.add_game(moves, result)
+                    elif builder is not None:
+                        builder.add_game(moves, result)
+                    else:
+                        self.insert_move(conn, moves, result, game_key)
+                    if game_key is not None and engine != 'per_move':
+                        # Committed together with the flush that writes the game
+                        self._record_game(conn, game_key)
+                except Exception as e:
+                    self._log_error(location, text, e)
+                if trie is not None and len(trie) >= self.chunk_size:
+                    self._flush_trie(conn, trie)
+
+            self.checkpoint = (source, position['byte_offset'], position['games_done'])
+            if trie is not None and len(trie):
+                self._flush_trie(conn, trie)
+            if builder is not None:
+                builder.finish()
+                if self.track_positions:
+                    rebuild_positions(conn)  # The builder only ever fills an empty tree
+                self.touched_parents = None
+            if self.min_count is not None:
+                prune_min_count(conn, self.min_count)
+
+            # Final commit after processing all moves
+            self._commit(conn)
+            self.checkpoint = None
+            if append:
+                print(f"Skipped {duplicates} games already in {self.db_path}")
+
+    def _iter_formatted_games(self, pgn_file: str, position: dict):
+        """
+        Yield (location, line, moves, result, None) for each line of a formatted file,
+        starting at position['byte_offset'] and advancing it as lines are read.
+        A parallel load checkpoints the end of a byte range, which can fall inside
+        a line; that line was already counted, so reading starts at the next one.
+        Progress is reported in bytes, so the file is only read once.
+        """
+        with open(pgn_file, 'rb') as file:
+            if position['byte_offset'] > 0:
+                # As in parallel_ingest.build_chunk: skip the tail of a line started before the offset
+                file.seek(position['byte_offset'] - 1)
+                file.readline()
+                position['byte_offset'] = file.tell()
+            with tqdm(total=os.path.getsize(pgn_file), initial=position['byte_offset'], unit='B',
+                      unit_scale=True, desc="Processing PGN") as pbar:
+                for raw in file:
+                    offset = position['byte_offset']
+                    position['byte_offset'] += len(raw)
+                    position['games_done'] += 1
+                    line = raw.decode('utf-8', errors='replace').strip()
+                    if line:
+                        try:
+                            moves, result = self._parse_pgn_line(line)
+                        except Exception as e:
+                            self._log_error(f"line at byte {offset}", line, e)
+                        else:
+                            yield f"line at byte {offset}", line, moves, result, None
+                    pbar.update(len(raw))  # Update progress bar
+
+    def _iter_raw_games(self, pgn_file: str, position: dict):
+        """
+        Yield (location, movetext, moves, result, tags) for each game of a raw PGN file.
+        Compressed streams can't be seeked, so resuming skips the first
+        position['games_done'] games (counting the ones the reader dropped).
+        """
+        errors = []
+        stream, raw = open_pgn(pgn_file)
+        games_to_skip = position['games_done']
+        games_seen = 0
+        with stream, tqdm(total=os.path.getsize(pgn_file), unit='B', unit_scale=True,
+                          desc="Processing PGN") as pbar:
+            for moves, result, tags in iter_pgn_games(stream, errors, with_tags=True):
+                games_seen += len(errors) + 1
+                if games_seen > games_to_skip:
+                    self._log_skipped_games(errors)
+                    position['games_done'] = games_seen
+                    position['byte_offset'] = raw.tell()
+                    yield f"game {games_seen}", " ".join(moves + [result]), moves, result, tags
+                errors.clear()
+                pbar.update(raw.tell() - pbar.n)  # Progress in (compressed) bytes read
+            if games_seen + len(errors) > games_to_skip:
+                self._log_skipped_games(errors)
+            position['games_done'] = max(games_seen + len(errors), games_to_skip)
+            position['byte_offset'] = raw.tell()
+
+    def _log_skipped_games(self, errors: list):
+        """Log games the PGN reader dropped."""
+        for game_num, reason in errors:
+            self._log_error(f"game {game_num}", "", reason)
+        errors.clear()
+
+    @staticmethod
+    def _log_error(location: str, text: str, error):
+        # Log errors with their position in the input in error_log.txt
+        with open("error_log.txt", "a") as log_file:
+            log_file.write(f"Error processing {location}: {text}. Error: {error}\n")
+
+    def _process_pgn_file_parallel(self, conn: sqlite3.Connection, source: str, workers: int, start_offset: int):
+        """Shard the file into byte ranges, count them in a process pool and merge in file order."""
+        # Several ranges per worker keeps each worker's tree small and the pool busy
+        ranges = split_byte_ranges(source, workers * 8, start_offset)
+        tasks = [(source, start, end, self.max_ply) for start, end in ranges]
+
+        trie = MoveTrie()
+        with Pool(workers) as pool, tqdm(total=os.path.getsize(source), initial=start_offset, unit='B',
+                                         unit_scale=True, desc="Processing PGN") as pbar:
+            # imap keeps chunk order, so games are merged (and ids assigned) in file order
+            for (_, end), (records, results, errors, chunk_bytes) in zip(ranges, pool.imap(build_chunk, tasks)):
+                trie.merge_records(records, results)
+                for offset, line, error in errors:
+                    self._log_error(f"line at byte {offset}", line, error)
+                self.checkpoint = (source, end, 0)
+                if len(trie) >= self.chunk_size:
+                    self._flush_trie(conn, trie)
+                pbar.update(chunk_bytes)
+
+        if len(trie):
+            self._flush_trie(conn, trie)
+        if self.min_count is not None:
+            prune_min_count(conn, self.min_count)
+        self._commit(conn)
+        self.checkpoint = None
+
+    def _flush_trie(self, conn: sqlite3.Connection, trie: MoveTrie):
+        """Write one aggregated chunk to the database as a single transaction."""
+        try:
+            if self.track_positions:
+                positions = PositionCounter()
+                positions.add_trie(trie.root)  # Before flush, which clears the tree
+                positions.flush(conn)
+            self.touched_parents.update(trie.flush(conn))
+            self._commit(conn)
+        except Exception as e:
+            conn.rollback()
+            raise Exception(f"Error flushing move tree: {e}")
 
     @staticmethod
     def _parse_pgn_line(line: str) -> Tuple[List[str], str]:
@@ -159,7 +500,7 @@ class ChessDatabase:
 def main():
     # Initialize the database and process a PGN file
     db = ChessDatabase('chess_game_data.db', batch_size=1000)  # Set batch size for performance
-    db.process_pgn_file('formatted_extracted_moves.pgn')
+    db.process_pgn_file('formatted_extracted_moves.pgn', engine='trie')  # Bulk load through the in-memory tree
     
     # Get statistics for a sequence of moves
     stats = db.get_statistics(['e4','e5','Nf3'])
@@ -0,0 +1,216 @@
+import heapq
+import os
+import sqlite3
+import tempfile
+from hashlib import blake2b
+from typing import Iterator, List, Optional, Tuple
+from move_trie import RESULT_INDEX, next_move_id
+from move_dictionary import MoveDictionary
+
+ROOT_HASH = '0' * 32  # Path hash of the (empty) root position
+ENTRY_BYTES = 320  # Rough in-memory cost of one aggregated (depth, parent, move) entry
+
+
+def path_hash(parent_hash: str, move: str) -> str:
+    """128-bit hash identifying a move path by its parent's path hash and the move."""
+    return blake2b(f"{parent_hash}\t{move}".encode(), digest_size=16).hexdigest()
+
+
+class ExternalSorter:
+    """
+    Sort an arbitrary number of text lines with bounded memory: lines are
+    buffered, spilled to sorted run files when the buffer is full and
+    k-way merged on iteration. Lines must not contain newlines.
+    """
+
+    def __init__(self, memory_limit_bytes: int, temp_dir: Optional[str] = None, max_fan_in: int = 256):
+        self.memory_limit_bytes = memory_limit_bytes
+        self.temp_dir = temp_dir
+        self.max_fan_in = max_fan_in
+        self.buffer: List[str] = []
+        self.buffer_bytes = 0
+        self.runs: List[str] = []
+
+    def add(self, line: str):
+        self.buffer.append(line)
+        self.buffer_bytes += len(line) + 64  # String object overhead
+        if self.buffer_bytes >= self.memory_limit_bytes:
+            self.add_sorted_run(sorted(self.buffer))
+            self.buffer = []
+            self.buffer_bytes = 0
+
+    def add_sorted_run(self, lines) -> str:
+        """Write already sorted lines straight to a new run file."""
+        fd, path = tempfile.mkstemp(suffix='.run', dir=self.temp_dir)
+        with os.fdopen(fd, 'w') as run:
+            for line in lines:
+                run.write(line + '\n')
+        self.runs.append(path)
+        return path
+
+    def _merge(self, runs: List[str]) -> Iterator[str]:
+        files = [open(path, 'r') for path in runs]
+        try:
+            for line in heapq.merge(*files):
+                yield line.rstrip('\n')
+        finally:
+            for file in files:
+                file.close()
+            for path in runs:
+                os.remove(path)
+
+    def __iter__(self) -> Iterator[str]:
+        if self.buffer:
+            self.add_sorted_run(sorted(self.buffer))
+            self.buffer = []
+            self.buffer_bytes = 0
+
+        # Merge in several passes if there are more runs than we want open at once
+        while len(self.runs) > self.max_fan_in:
+            batch, self.runs = self.runs[:self.max_fan_in], self.runs[self.max_fan_in:]
+            self.add_sorted_run(self._merge(batch))
+
+        runs, self.runs = self.runs, []
+        return self._merge(runs)
+
+    def cleanup(self):
+        for path in self.runs:
+            if os.path.exists(path):
+                os.remove(path)
+        self.runs = []
+        self.buffer = []
+        self.buffer_bytes = 0
+
+
+class ExternalTreeBuilder:
+    """
+    Memory-bounded builder for the Moves table.
+
+    Every ply of every game becomes a (depth, parent path hash, move) record.
+    Records are counted in a dictionary until `memory_limit_bytes` is reached,
+    then spilled as a sorted run; `finish` k-way merges the runs, sums equal
+    records and writes one Moves row per node, level by level. Parent ids are
+    resolved by merge-joining each level against the sorted (path hash, id)
+    pairs of the level above, so no step needs the whole tree in memory.
+
+    Ids are handed out breadth first rather than in first-appearance order,
+    so only an empty Moves table can be built this way.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, memory_limit_bytes: int, temp_dir: Optional[str] = None,
+                 insert_batch: int = 10000):
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM Moves LIMIT 1")
+        if cursor.fetchone():
+            raise ValueError("The external sort engine can only build an empty Moves table")
+
+        self.conn = conn
+        self.temp_dir = temp_dir
+        self.insert_batch = insert_batch
+        self.memory_limit_bytes = memory_limit_bytes
+        self.max_entries = max(1, memory_limit_bytes // ENTRY_BYTES)
+        self.counts = {}  # (depth, parent_hash, move) -> [white, black, draw, unfinished]
+        self.runs = ExternalSorter(memory_limit_bytes, temp_dir)
+        self.results: List[Tuple[str]] = []
+
+    def add_game(self, move_sequence: List[str], result: str):
+        index = RESULT_INDEX.get(result, 3)
+        parent_hash = ROOT_HASH
+        for depth, move in enumerate(move_sequence):
+            key = (depth, parent_hash, move)
+            counts = self.counts.get(key)
+            if counts is None:
+                counts = self.counts[key] = [0, 0, 0, 0]
+            counts[index] += 1
+            parent_hash = path_hash(parent_hash, move)
+
+        self.results.append((result,))
+        if len(self.results) >= self.insert_batch:
+            self._write_results()
+        if len(self.counts) >= self.max_entries:
+            self._spill()
+
+    def _write_results(self):
+        self.conn.executemany("""
+            INSERT INTO GameStats (result) VALUES (?);
+        """, self.results)
+        self.results = []
+
+    def _spill(self):
+        # Fixed-width depth and hash make the lexical line order equal to the
+        # (depth, parent_hash, move) tuple order
+        self.runs.add_sorted_run(
+            f"{depth:05d}\t{parent_hash}\t{move}\t{counts[0]}\t{counts[1]}\t{counts[2]}\t{counts[3]}"
+            for (depth, parent_hash, move), counts in sorted(self.counts.items())
+        )
+        self.counts = {}
+
+    def _merged_nodes(self) -> Iterator[Tuple[int, str, str, List[int]]]:
+        """Yield (depth, parent_hash, move, counts) once per node, summed over all runs."""
+        if self.counts:
+            self._spill()
+        current_key = None
+        current_counts = None
+        for line in self.runs:
+            depth, parent_hash, move, *counts = line.split('\t')
+            key = (depth, parent_hash, move)
+            if key != current_key:
+                if current_key is not None:
+                    yield int(current_key[0]), current_key[1], current_key[2], current_counts
+                current_key = key
+                current_counts = [int(count) for count in counts]
+            else:
+                for i, count in enumerate(counts):
+                    current_counts[i] += int(count)
+        if current_key is not None:
+            yield int(current_key[0]), current_key[1], current_key[2], current_counts
+
+    def finish(self):
+        """Merge all runs and write the Moves rows. The caller is responsible for committing."""
+        if self.results:
+            self._write_results()
+
+        cursor = self.conn.cursor()
+        move_dict = MoveDictionary(self.conn)
+        next_id = next_move_id(cursor)
+        inserts = []
+        current_depth = None
+        level_ids = None  # Sorted (path hash, id) pairs of the level being written
+        parents = iter(())  # Sorted (path hash, id) pairs of the level above
+        parent_hash, parent_id = None, None
+
+        try:
+            for depth, node_parent_hash, move, counts in self._merged_nodes():
+                if depth != current_depth:
+                    parents = iter(level_ids) if level_ids is not None else iter(())
+                    parent_hash, parent_id = None, None
+                    level_ids = ExternalSorter(self.memory_limit_bytes, self.temp_dir)
+                    current_depth = depth
+
+                if depth > 0:
+                    # Children arrive sorted by parent hash, so the join only moves forward
+                    while parent_hash != node_parent_hash:
+                        parent_hash, parent_id = next(parents).split('\t')
+                    parent_id = int(parent_id)
+
+                inserts.append((next_id, move_dict.encode(move), parent_id if depth > 0 else None, *counts))
+                level_ids.add(f"{path_hash(node_parent_hash, move)}\t{next_id}")
+                next_id += 1
+
+                if len(inserts) >= self.insert_batch:
+                    self._write_moves(cursor, inserts)
+                    inserts = []
+
+            self._write_moves(cursor, inserts)
+        finally:
+            self.runs.cleanup()
+            if level_ids is not None:
+                level_ids.cleanup()
+
+    @staticmethod
+    def _write_moves(cursor: sqlite3.Cursor, inserts):
+        cursor.executemany("""
+            INSERT INTO Moves (id, move, parent_id, white_win_count, black_win_count,
+                               draw_count, unfinished_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, inserts)
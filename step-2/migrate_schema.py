@@ -0,0 +1,166 @@
+import argparse
+import sqlite3
+from sqlite_db_creation import (SCHEMA_VERSION, MOVES_INDEX_SQL, MOVES_TOTAL_INDEX_SQL, MOVEDICT_TABLE_SQL,
+                                POSITIONS_TABLE_SQL, GAMEHASHES_TABLE_SQL, TREEVERSION_TABLE_SQL,
+                                INGESTCHECKPOINT_TABLE_SQL)
+from positions import rebuild_positions
+from sibling_ranks import update_sibling_ranks
+
+# Moves layout as of v2; kept here so migrate_to_v2 doesn't change along with the current schema
+MOVES_V2_SQL = '''CREATE TABLE IF NOT EXISTS Moves_v2 (
+    id INTEGER PRIMARY KEY,
+    parent_id INTEGER,
+    move TEXT NOT NULL,
+    white_win_count INTEGER NOT NULL DEFAULT 0,
+    black_win_count INTEGER NOT NULL DEFAULT 0,
+    draw_count INTEGER NOT NULL DEFAULT 0,
+    unfinished_count INTEGER NOT NULL DEFAULT 0,
+    total INTEGER GENERATED ALWAYS AS
+        (white_win_count + black_win_count + draw_count + unfinished_count) STORED,
+    FOREIGN KEY (parent_id) REFERENCES Moves_v2(id)
+)'''
+
+# Moves layout as of v3, likewise
+MOVES_V3_SQL = '''CREATE TABLE IF NOT EXISTS Moves_v3 (
+    id INTEGER PRIMARY KEY,
+    parent_id INTEGER,
+    move INTEGER NOT NULL,
+    white_win_count INTEGER NOT NULL DEFAULT 0,
+    black_win_count INTEGER NOT NULL DEFAULT 0,
+    draw_count INTEGER NOT NULL DEFAULT 0,
+    unfinished_count INTEGER NOT NULL DEFAULT 0,
+    total INTEGER GENERATED ALWAYS AS
+        (white_win_count + black_win_count + draw_count + unfinished_count) STORED,
+    FOREIGN KEY (parent_id) REFERENCES Moves_v3(id)
+)'''
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    """Schema version of a database; databases from before versioning report 1."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    return version if version > 0 else 1
+
+
+def migrate_to_v2(conn: sqlite3.Connection):
+    """Rebuild Moves with an integer key, a stored total and a unique (parent_id, move) index."""
+    cursor = conn.cursor()
+    cursor.execute(MOVES_V2_SQL)
+    cursor.execute("""
+        INSERT INTO Moves_v2 (id, parent_id, move, white_win_count, black_win_count,
+                              draw_count, unfinished_count)
+        SELECT id, parent_id, move, white_win_count, black_win_count,
+               draw_count, unfinished_count
+        FROM Moves
+        ORDER BY id
+    """)
+    cursor.execute("DROP TABLE Moves")
+    cursor.execute("ALTER TABLE Moves_v2 RENAME TO Moves")
+    cursor.execute(MOVES_INDEX_SQL)
+
+
+def migrate_to_v3(conn: sqlite3.Connection):
+    """Replace the SAN text in Moves.move with MoveDict codes."""
+    cursor = conn.cursor()
+    cursor.execute(MOVEDICT_TABLE_SQL)
+    # Most frequent moves get the lowest codes, which SQLite stores in one byte
+    cursor.execute("""
+        INSERT INTO MoveDict (san)
+        SELECT move FROM Moves GROUP BY move ORDER BY COUNT(*) DESC, move
+    """)
+    cursor.execute(MOVES_V3_SQL)
+    cursor.execute("""
+        INSERT INTO Moves_v3 (id, parent_id, move, white_win_count, black_win_count,
+                              draw_count, unfinished_count)
+        SELECT m.id, m.parent_id, d.code, m.white_win_count, m.black_win_count,
+               m.draw_count, m.unfinished_count
+        FROM Moves m JOIN MoveDict d ON d.san = m.move
+        ORDER BY m.id
+    """)
+    cursor.execute("DROP TABLE Moves")
+    cursor.execute("ALTER TABLE Moves_v3 RENAME TO Moves")
+    cursor.execute(MOVES_INDEX_SQL)
+
+
+def migrate_to_v4(conn: sqlite3.Connection):
+    """Add the Positions table and fill it by replaying the Moves tree."""
+    conn.execute(POSITIONS_TABLE_SQL)
+    rebuild_positions(conn)
+
+
+def migrate_to_v5(conn: sqlite3.Connection):
+    """
+    Add the GameHashes table. Games loaded before it existed have no identity
+    on record and can't be deduplicated: append mode doesn't recognise them,
+    so a dump overlapping the older data counts the shared games twice.
+    """
+    conn.execute(GAMEHASHES_TABLE_SQL)
+
+
+def migrate_to_v6(conn: sqlite3.Connection):
+    """Add the sibling_rank column and the (parent_id, total DESC) index, and rank every move."""
+    conn.execute("ALTER TABLE Moves ADD COLUMN sibling_rank INTEGER")
+    conn.execute(MOVES_TOTAL_INDEX_SQL)
+    update_sibling_ranks(conn)
+
+
+def migrate_to_v7(conn: sqlite3.Connection):
+    """Add the TreeVersion counter."""
+    conn.execute(TREEVERSION_TABLE_SQL)
+    conn.execute("INSERT INTO TreeVersion (version) VALUES (0)")
+
+
+def migrate_to_v8(conn: sqlite3.Connection):
+    """Add the IngestCheckpoint table (resumed loads used to create it on the fly)."""
+    conn.execute(INGESTCHECKPOINT_TABLE_SQL)
+
+
+# Version a migration upgrades to -> function doing the upgrade
+MIGRATIONS = {
+    2: migrate_to_v2,
+    3: migrate_to_v3,
+    4: migrate_to_v4,
+    5: migrate_to_v5,
+    6: migrate_to_v6,
+    7: migrate_to_v7,
+    8: migrate_to_v8,
+}
+
+
+def migrate(db_path: str, vacuum: bool = True):
+    """Upgrade a database in place to SCHEMA_VERSION, one version per transaction."""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        version = schema_version(conn)
+        print(f"{db_path}: schema version {version}")
+        while version < SCHEMA_VERSION:
+            version += 1
+            print(f"Migrating to version {version}...")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                MIGRATIONS[version](conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        if vacuum:
+            # Reclaim the space of the old tables and defragment the new ones
+            print("Vacuuming...")
+            conn.execute("VACUUM")
+        print(f"{db_path} is at schema version {version}")
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upgrade a chess game database to the current schema in place.")
+    parser.add_argument('db_path', nargs='?', default='chess_game_data.db')
+    parser.add_argument('--no-vacuum', action='store_true', help="skip the final VACUUM")
+    args = parser.parse_args()
+
+    migrate(args.db_path, vacuum=not args.no_vacuum)
+
+
+if __name__ == "__main__":
+    main()
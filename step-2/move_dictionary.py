@@ -0,0 +1,44 @@
+import sqlite3
+from typing import Dict, Optional
+
+# Pseudo-move under which compact_tree.py folds the counts of a parent's pruned
+# children; it can't clash with a real SAN move
+OTHER_MOVE = '<other>'
+
+
+class MoveDictionary:
+    """
+    In-memory copy of the MoveDict table, which interns every distinct SAN
+    string as a small integer code. Moves.move stores the code.
+
+    There are only a few thousand distinct SAN moves, so the whole table is
+    loaded once per connection and new moves are added on first use.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.codes: Dict[str, int] = {}
+        self.sans: Dict[int, str] = {}
+        self.reload()
+
+    def reload(self):
+        """Re-read the table, e.g. after a rollback discarded newly added moves."""
+        self.codes = dict(self.conn.execute("SELECT san, code FROM MoveDict"))
+        self.sans = {code: san for san, code in self.codes.items()}
+
+    def lookup(self, san: str) -> Optional[int]:
+        """Code of a SAN move, or None if no game in the database has played it."""
+        return self.codes.get(san)
+
+    def encode(self, san: str) -> int:
+        """Code of a SAN move, adding it to MoveDict (in the current transaction) if needed."""
+        code = self.codes.get(san)
+        if code is None:
+            cursor = self.conn.execute("INSERT INTO MoveDict (san) VALUES (?)", (san,))
+            code = cursor.lastrowid
+            self.codes[san] = code
+            self.sans[code] = san
+        return code
+
+    def decode(self, code: int) -> str:
+        return self.sans[code]
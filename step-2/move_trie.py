@@ -0,0 +1,185 @@
+import sqlite3
+from typing import Dict, List, Optional, Set, Tuple
+from move_dictionary import MoveDictionary
+
+# Index into the per-node counts list for each game result
+RESULT_INDEX = {
+    '1-0': 0,
+    '0-1': 1,
+    '1/2-1/2': 2,
+    '*': 3
+}
+
+
+def next_move_id(cursor: sqlite3.Cursor) -> int:
+    """Next id the Moves table would hand out on an INSERT without an explicit id."""
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM Moves")
+    next_id = cursor.fetchone()[0] + 1
+    try:
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'Moves'")
+        row = cursor.fetchone()
+        if row:
+            next_id = max(next_id, row[0] + 1)
+    except sqlite3.OperationalError:
+        pass  # No AUTOINCREMENT table in this database
+    return next_id
+
+
+class TrieNode:
+    """A single (parent, move) node of the in-memory opening tree."""
+    __slots__ = ('counts', 'children', 'first_seen')
+
+    def __init__(self, first_seen: int):
+        self.counts = [0, 0, 0, 0]  # white wins, black wins, draws, unfinished
+        self.children: Dict[str, 'TrieNode'] = {}
+        self.first_seen = first_seen  # Ordinal of the first game that reached this node
+
+
+class MoveTrie:
+    """
+    Aggregate W/B/D/unfinished counts for every move path in memory and
+    flush them to the Moves table in one go.
+
+    New nodes get their ids in the same order the per-move path would
+    have created them (first game that reached the node, then ply), so a
+    bulk load produces exactly the same Moves/GameStats rows.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """Drop all aggregated nodes and game results."""
+        self.root = TrieNode(first_seen=0)
+        self.results: List[str] = []  # One entry per game, in input order
+        self.node_count = 0
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def add_game(self, move_sequence: List[str], result: str, game_ordinal: Optional[int] = None):
+        """Add one game's moves to the tree and count its result at every ply."""
+        if game_ordinal is None:
+            game_ordinal = len(self.results)
+        index = RESULT_INDEX.get(result, 3)
+
+        node = self.root
+        for move in move_sequence:
+            child = node.children.get(move)
+            if child is None:
+                child = TrieNode(game_ordinal)
+                node.children[move] = child
+                self.node_count += 1
+            child.counts[index] += 1
+            node = child
+
+        self.results.append(result)
+
+    def to_records(self) -> List[Tuple[int, str, int, int, int, int, int]]:
+        """
+        Flatten the tree into pre-order records that can be pickled cheaply:
+        (parent_index, move, white, black, draw, unfinished, first_seen).
+        Index 0 is the root; a record's own index is its position + 1.
+        """
+        records = []
+        stack = [(0, self.root)]
+        while stack:
+            parent_index, node = stack.pop()
+            for move, child in node.children.items():
+                records.append((parent_index, move, *child.counts, child.first_seen))
+                stack.append((len(records), child))
+        return records
+
+    def merge_records(self, records: List[Tuple[int, str, int, int, int, int, int]], results: List[str]):
+        """Merge records produced by `to_records` (e.g. from a worker process) into this tree."""
+        nodes = [self.root]
+        for parent_index, move, white, black, draw, unfinished, first_seen in records:
+            parent = nodes[parent_index]
+            node = parent.children.get(move)
+            if node is None:
+                node = TrieNode(first_seen)
+                parent.children[move] = node
+                self.node_count += 1
+            elif first_seen < node.first_seen:
+                node.first_seen = first_seen
+            counts = node.counts
+            counts[0] += white
+            counts[1] += black
+            counts[2] += draw
+            counts[3] += unfinished
+            nodes.append(node)
+
+        self.results.extend(results)
+
+    def flush(self, conn: sqlite3.Connection) -> Set[Optional[int]]:
+        """
+        Write the aggregated counts into the Moves/GameStats tables with
+        executemany and reset the tree. The caller is responsible for committing.
+        Returns the ids of the nodes whose children changed (None for the root).
+        """
+        cursor = conn.cursor()
+        move_dict = MoveDictionary(conn)
+        new_nodes = []  # (first_seen, depth, parent_id, parent, move, node)
+        updates = []
+        touched = set()
+
+        # Resolve which nodes already exist in the database. Only children of
+        # existing nodes need a lookup, everything below a new node is new too.
+        stack = [(None, self.root, 0, True)]
+        while stack:
+            parent_id, node, depth, parent_exists = stack.pop()
+            for move, child in node.children.items():
+                move_id = None
+                code = move_dict.lookup(move)
+                if parent_exists and code is not None:
+                    cursor.execute("""
+                        SELECT id FROM Moves WHERE move = ? AND parent_id IS ?
+                    """, (code, parent_id))
+                    row = cursor.fetchone()
+                    if row:
+                        move_id = row[0]
+
+                if move_id is not None:
+                    updates.append((*child.counts, move_id))
+                    touched.add(parent_id)
+                    stack.append((move_id, child, depth + 1, True))
+                else:
+                    new_nodes.append((child.first_seen, depth, parent_id if parent_exists else None,
+                                      node, move, child))
+                    stack.append((None, child, depth + 1, False))
+
+        # Hand out ids in the order the per-move path would have inserted them.
+        # A parent always sorts before its children (same or earlier game, lower ply).
+        new_nodes.sort(key=lambda entry: (entry[0], entry[1]))
+        next_id = next_move_id(cursor)
+        new_ids = {}
+        inserts = []
+        for _, _, parent_id, parent, move, child in new_nodes:
+            if parent_id is None and parent is not self.root:
+                parent_id = new_ids[id(parent)]
+            new_ids[id(child)] = next_id
+            touched.add(parent_id)
+            inserts.append((next_id, move_dict.encode(move), parent_id, *child.counts))
+            next_id += 1
+
+        cursor.executemany("""
+            INSERT INTO Moves (id, move, parent_id, white_win_count, black_win_count,
+                               draw_count, unfinished_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, inserts)
+
+        cursor.executemany("""
+            UPDATE Moves SET
+                white_win_count = white_win_count + ?,
+                black_win_count = black_win_count + ?,
+                draw_count = draw_count + ?,
+                unfinished_count = unfinished_count + ?
+            WHERE id = ?
+        """, updates)
+
+        cursor.executemany("""
+            INSERT INTO GameStats (result) VALUES (?);
+        """, [(result,) for result in self.results])
+
+        self.clear()
+        return touched
@@ -0,0 +1,57 @@
+import os
+from typing import List, Optional, Tuple
+from move_trie import MoveTrie
+
+
+def split_byte_ranges(pgn_file: str, num_chunks: int, start: int = 0) -> List[Tuple[int, int]]:
+    """
+    Split a file from `start` to the end into `num_chunks` contiguous byte ranges.
+    Ranges don't need to fall on line boundaries: a line belongs to the range
+    its first byte is in.
+    """
+    file_size = os.path.getsize(pgn_file)
+    num_chunks = max(1, min(num_chunks, file_size - start))
+    step = (file_size - start) // num_chunks
+    bounds = [start + i * step for i in range(num_chunks)] + [file_size]
+    return [(bounds[i], bounds[i + 1]) for i in range(num_chunks) if bounds[i] < bounds[i + 1]]
+
+
+def build_chunk(args: Tuple[str, int, int, Optional[int]]):
+    """
+    Worker: aggregate all games whose line starts inside [start, end) into a
+    MoveTrie and return it in flattened form, together with the game results
+    and any lines that failed to parse. Games are cut off after max_ply moves
+    if it isn't None.
+
+    Each game's byte offset is used as its ordinal, so merging chunks in any
+    order still hands out ids in the same order as a sequential load.
+    """
+    from data_loading import ChessDatabase  # Deferred: data_loading imports this module
+
+    pgn_file, start, end, max_ply = args
+    trie = MoveTrie()
+    errors = []
+
+    with open(pgn_file, 'rb') as file:
+        if start > 0:
+            # Skip the tail of a line that started in the previous range
+            file.seek(start - 1)
+            file.readline()
+        offset = file.tell()
+
+        while offset < end:
+            raw = file.readline()
+            if not raw:
+                break
+            line = raw.decode('utf-8', errors='replace').strip()
+            if line:
+                try:
+                    moves, result = ChessDatabase._parse_pgn_line(line)
+                    if max_ply is not None:
+                        moves = moves[:max_ply]
+                    trie.add_game(moves, result, game_ordinal=offset)
+                except Exception as e:
+                    errors.append((offset, line, str(e)))
+            offset += len(raw)
+
+    return trie.to_records(), trie.results, errors, end - start
@@ -0,0 +1,138 @@
+import bz2
+import gzip
+import hashlib
+import io
+import lzma
+import re
+from typing import BinaryIO, Dict, Iterator, List, Optional, TextIO, Tuple
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+# Braces, parentheses and ';' are tokens on their own so comments and
+# variations can be skipped even when they are glued to a move ("e4{good}")
+TOKEN_RE = re.compile(r'[{}();]|[^\s{}();]+')
+MOVE_NUMBER_RE = re.compile(r'^\d+\.+')
+ANNOTATION_RE = re.compile(r'[!?]+$')
+TAG_RE = re.compile(r'^\[(\w+)\s+"(.*)"\]')
+
+# The Seven Tag Roster; together with the moves they identify a game
+IDENTITY_TAGS = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+
+OPENERS = {
+    '.gz': gzip.GzipFile,
+    '.bz2': bz2.BZ2File,
+    '.xz': lzma.LZMAFile,
+}
+
+
+def open_pgn(pgn_file: str) -> Tuple[TextIO, BinaryIO]:
+    """
+    Open a raw PGN file, transparently decompressing .gz/.bz2/.xz.
+    Returns the text stream and the underlying file, whose position can be
+    used for progress reporting.
+    """
+    raw = open(pgn_file, 'rb')
+    for suffix, opener in OPENERS.items():
+        if pgn_file.endswith(suffix):
+            return io.TextIOWrapper(opener(fileobj=raw), encoding='utf-8', errors='replace'), raw
+    return io.TextIOWrapper(raw, encoding='utf-8', errors='replace'), raw
+
+
+def iter_pgn_games(stream: TextIO, errors: Optional[list] = None, with_tags: bool = False) -> Iterator[tuple]:
+    """
+    Stream (moves, result) tuples from PGN text, the equivalent of
+    `pgn-extract --nomovenumbers --nocomments --novars --notags --nonags`
+    followed by the tr/sed formatting in commands.txt.
+
+    Tags, {} and ; comments, NAGs, move numbers, move annotations (!, ?) and
+    (nested) variations are dropped. Games with a null move (--) in the main
+    line are skipped; if `errors` is given, (game_number, reason) is appended
+    for every skipped game.
+
+    With with_tags=True (moves, result, tags) is yielded instead, tags being
+    a dict of the game's tag pairs.
+    """
+    moves: List[str] = []
+    tags: Dict[str, str] = {}
+    in_comment = False
+    variation_depth = 0
+    invalid_reason = None
+    game_number = 1
+
+    def finish_game(result: str):
+        nonlocal moves, tags, invalid_reason, game_number
+        game = None
+        if invalid_reason is not None:
+            if errors is not None:
+                errors.append((game_number, invalid_reason))
+        elif moves:
+            game = (moves, result, tags) if with_tags else (moves, result)
+        moves = []
+        tags = {}
+        invalid_reason = None
+        game_number += 1
+        return game
+
+    for line in stream:
+        if not in_comment and variation_depth == 0:
+            stripped = line.lstrip()
+            if line.startswith('%'):
+                continue  # Escape mechanism, the rest of the line is ignored
+            if stripped.startswith('['):
+                # A tag pair; if moves are pending the previous game had no result
+                if moves or invalid_reason is not None:
+                    game = finish_game('*')
+                    if game:
+                        yield game
+                tag = TAG_RE.match(stripped)
+                if tag:
+                    tags[tag.group(1)] = tag.group(2)
+                continue
+
+        for token in TOKEN_RE.findall(line):
+            if in_comment:
+                if token == '}':
+                    in_comment = False
+                continue
+            if token == '{':
+                in_comment = True
+            elif token == ';':
+                break  # Comment until the end of the line
+            elif token == '(':
+                variation_depth += 1
+            elif token == ')':
+                variation_depth = max(0, variation_depth - 1)
+            elif variation_depth > 0 or token.startswith('$'):
+                continue
+            elif token in RESULTS:
+                game = finish_game(token)
+                if game:
+                    yield game
+            else:
+                move = ANNOTATION_RE.sub('', MOVE_NUMBER_RE.sub('', token))
+                if not move or move == 'e.p.':
+                    continue
+                if move == '--':
+                    invalid_reason = "Null moves (--) only allowed in variations"
+                moves.append(move)
+
+    if moves or invalid_reason is not None:
+        game = finish_game('*')
+        if game:
+            yield game
+
+
+def read_pgn_games(pgn_file: str, errors: Optional[list] = None) -> Iterator[Tuple[List[str], str]]:
+    """Stream (moves, result) tuples straight from a (possibly compressed) raw PGN file."""
+    stream, _ = open_pgn(pgn_file)
+    with stream:
+        yield from iter_pgn_games(stream, errors)
+
+
+def game_hash(moves: List[str], result: str, tags: Dict[str, str]) -> bytes:
+    """
+    16-byte identity of a game: its moves, result and Seven Tag Roster.
+    Other tags are left out, as exports of the same game don't always agree on them.
+    """
+    roster = "\t".join(tags.get(name, '') for name in IDENTITY_TAGS)
+    return hashlib.blake2b(f"{roster}\n{' '.join(moves)}\n{result}".encode('utf-8'), digest_size=16).digest()
@@ -0,0 +1,142 @@
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Set
+import chess
+import chess.polyglot
+from move_dictionary import MoveDictionary
+
+# Polyglot keys are unsigned 64-bit; SQLite integers are signed
+_KEY_OFFSET = 1 << 64
+_KEY_SIGN = 1 << 63
+
+
+def position_key(board: chess.Board) -> int:
+    """Polyglot Zobrist hash of a position, as the signed 64-bit integer stored in Positions.zobrist."""
+    key = chess.polyglot.zobrist_hash(board)
+    return key - _KEY_OFFSET if key >= _KEY_SIGN else key
+
+
+def fen_key(fen: str) -> int:
+    """Positions.zobrist key of a FEN string."""
+    return position_key(chess.Board(fen))
+
+
+def game_position_keys(move_sequence: List[str]) -> List[int]:
+    """
+    Keys of the distinct positions a game reaches after each of its moves,
+    in order of first occurrence. Stops at the first move python-chess
+    can't play, since the positions after it are unknown.
+    """
+    board = chess.Board()
+    keys = []
+    seen = set()
+    for move in move_sequence:
+        try:
+            board.push_san(move)
+        except ValueError:
+            break
+        key = position_key(board)
+        if key not in seen:
+            seen.add(key)
+            keys.append(key)
+    return keys
+
+
+class PositionCounter:
+    """
+    W/B/D/unfinished counts per position, accumulated in memory and added
+    to the Positions table with one executemany.
+
+    A game is counted once per position it reaches, however often it
+    repeats it.
+    """
+
+    def __init__(self):
+        self.counts: Dict[int, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def add(self, key: int, counts: Iterable[int]):
+        total = self.counts.get(key)
+        if total is None:
+            self.counts[key] = list(counts)
+        else:
+            for i, count in enumerate(counts):
+                total[i] += count
+
+    def add_trie(self, root):
+        """
+        Count every position of an aggregated MoveTrie.
+
+        A trie node's counts are the games that followed its path, so each
+        node is replayed once instead of once per game. A node whose
+        position already occurred higher up its own path is skipped: those
+        games were counted at the ancestor.
+        """
+        self._add_subtree(chess.Board(), root.children.items(), lambda node: node.children.items(),
+                          lambda node: node.counts, set())
+
+    def add_moves_table(self, conn: sqlite3.Connection):
+        """Count every position of the Moves tree, the same way add_trie does."""
+        cursor = conn.cursor()
+        move_dict = MoveDictionary(conn)
+
+        def children(parent_id: Optional[int]):
+            rows = cursor.execute("""
+                SELECT id, move, white_win_count, black_win_count, draw_count, unfinished_count
+                FROM Moves WHERE parent_id IS ?
+            """, (parent_id,)).fetchall()
+            return [(move_dict.decode(row[1]), row) for row in rows]
+
+        self._add_subtree(chess.Board(), children(None), lambda row: children(row[0]),
+                          lambda row: row[2:], set())
+
+    def _add_subtree(self, board: chess.Board, nodes, children, counts, path_keys: Set[int]):
+        # Iterative DFS; games can be several hundred plies deep
+        stack = [iter(nodes)]
+        added = []  # Per level: key this level added to path_keys, or None
+        while stack:
+            entry = next(stack[-1], None)
+            if entry is None:
+                stack.pop()
+                if added:
+                    key = added.pop()
+                    if key is not None:
+                        path_keys.discard(key)
+                    board.pop()
+                continue
+
+            move, node = entry
+            try:
+                board.push_san(move)
+            except ValueError:
+                continue  # Illegal or unparsable SAN: nothing below it can be replayed
+            key = position_key(board)
+            if key in path_keys:
+                added.append(None)
+            else:
+                self.add(key, counts(node))
+                path_keys.add(key)
+                added.append(key)
+            stack.append(iter(children(node)))
+
+    def flush(self, conn: sqlite3.Connection):
+        """Add the accumulated counts to Positions (in the caller's transaction) and clear them."""
+        conn.executemany("""
+            INSERT INTO Positions (zobrist, white_win_count, black_win_count, draw_count, unfinished_count)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (zobrist) DO UPDATE SET
+                white_win_count = white_win_count + excluded.white_win_count,
+                black_win_count = black_win_count + excluded.black_win_count,
+                draw_count = draw_count + excluded.draw_count,
+                unfinished_count = unfinished_count + excluded.unfinished_count
+        """, ((key, *counts) for key, counts in self.counts.items()))
+        self.counts.clear()
+
+
+def rebuild_positions(conn: sqlite3.Connection):
+    """Recompute the whole Positions table from the Moves tree (in the caller's transaction)."""
+    conn.execute("DELETE FROM Positions")
+    counter = PositionCounter()
+    counter.add_moves_table(conn)
+    counter.flush(conn)
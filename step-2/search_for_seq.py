@@ -1,13 +1,20 @@
-import sqlite3
+import os
+import sys
 from typing import List, Optional
+import chess
+from positions import position_key, fen_key
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'step3'))
+from opening_tree import ConnectionPool
 
 class ChessDatabase:
     def __init__(self, db_path: str):
         self.db_path = db_path
+        self.pool = ConnectionPool(db_path)  # Long-lived read-only connections (step3/opening_tree.py)
 
     def get_statistics(self, move_sequence: List[str]) -> Optional[dict]:
         """Get cumulative statistics for a move sequence."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             parent_id = None
 
@@ -16,7 +23,7 @@ class ChessDatabase:
                     SELECT id, white_win_count, black_win_count, 
                            draw_count, unfinished_count
                     FROM Moves 
-                    WHERE move = ? AND parent_id IS ?
+                    WHERE move = (SELECT code FROM MoveDict WHERE san = ?) AND parent_id IS ?
                 """, (move, parent_id))
 
                 row = cursor.fetchone()
@@ -44,6 +51,33 @@ class ChessDatabase:
                 'total_games': total_games
             }
 
+    def get_statistics_by_board(self, board: chess.Board) -> Optional[dict]:
+        """Get statistics for a position over every move order that reaches it."""
+        return self._position_statistics(position_key(board))
+
+    def get_statistics_by_fen(self, fen: str) -> Optional[dict]:
+        """Get statistics for the position of a FEN string."""
+        return self._position_statistics(fen_key(fen))
+
+    def _position_statistics(self, key: int) -> Optional[dict]:
+        with self.pool.connection() as conn:
+            row = conn.execute("""
+                SELECT white_win_count, black_win_count, draw_count, unfinished_count
+                FROM Positions
+                WHERE zobrist = ?
+            """, (key,)).fetchone()
+        if not row:
+            return None
+
+        total_games = sum(row)
+        return {
+            'white_win_rate': row[0],
+            'black_win_rate': row[1],
+            'draw_rate': row[2],
+            'unfinished_rate': row[3],
+            'total_games': total_games
+        }
+
 def main():
     # Initialize the database connection
     db = ChessDatabase('chess_game_data.db')
@@ -61,5 +95,15 @@ def main():
     else:
         print(f"No statistics found for {' '.join(move_sequence)}.")
 
+    # The same position, counted over every move order that reaches it
+    board = chess.Board()
+    for move in move_sequence:
+        board.push_san(move)
+    stats = db.get_statistics_by_board(board)
+    if stats:
+        print(f"\nStatistics for the position {board.fen()}:")
+        for key, value in stats.items():
+            print(f"{key}: {value}")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,37 @@
+import sqlite3
+from typing import Iterable, Optional
+from move_dictionary import MoveDictionary, OTHER_MOVE
+
+
+def update_sibling_ranks(conn: sqlite3.Connection, parent_ids: Optional[Iterable[Optional[int]]] = None):
+    """
+    Recompute Moves.sibling_rank, the popularity rank of each move among the
+    children of its parent (1 = most played; ties go to the older node), in
+    the caller's transaction. Only the children of parent_ids are ranked
+    again, None among them meaning the first moves; parent_ids=None re-ranks
+    the whole tree. '<other>' buckets are left unranked.
+    """
+    other = MoveDictionary(conn).lookup(OTHER_MOVE)
+    where = ""
+    if parent_ids is not None:
+        parent_ids = set(parent_ids)
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS ranked_parents (id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM temp.ranked_parents")
+        conn.executemany("INSERT INTO temp.ranked_parents (id) VALUES (?)",
+                         ((parent_id,) for parent_id in parent_ids if parent_id is not None))
+        where = "WHERE parent_id IN (SELECT id FROM temp.ranked_parents)"
+        if None in parent_ids:
+            where += " OR parent_id IS NULL"
+
+    conn.execute(f"""
+        UPDATE Moves SET sibling_rank = ranked.sibling_rank
+        FROM (
+            SELECT id,
+                   CASE WHEN move IS :other THEN NULL ELSE
+                       ROW_NUMBER() OVER (PARTITION BY parent_id, move IS :other ORDER BY total DESC, id)
+                   END AS sibling_rank
+            FROM Moves
+            {where}
+        ) AS ranked
+        WHERE Moves.id = ranked.id AND Moves.sibling_rank IS NOT ranked.sibling_rank
+    """, {'other': other})
@@ -1,27 +1,138 @@
 import sqlite3
 
-# Connect to the SQLite database
-conn = sqlite3.connect('chess_game_data2.db')
-cursor = conn.cursor()
+# Bumped whenever the layout below changes; stored in PRAGMA user_version.
+# Existing databases are upgraded with migrate_schema.py.
+SCHEMA_VERSION = 8
 
-# Create Moves table
-cursor.execute('''CREATE TABLE IF NOT EXISTS Moves (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
+
+def moves_table_sql(table_name: str = 'Moves') -> str:
+    """
+    Moves table, schema v6.
+
+    id is an INTEGER PRIMARY KEY, i.e. the rowid itself, so parent_id joins
+    and child lookups hit the table B-tree by integer key. (A WITHOUT ROWID
+    table would need a NOT NULL primary key, but root moves have a NULL
+    parent_id.) total is stored so ranking children doesn't recompute it.
+    move is a MoveDict code rather than the SAN text. sibling_rank is the
+    move's popularity among its siblings, kept up to date by sibling_ranks.py.
+    """
+    return f'''CREATE TABLE IF NOT EXISTS {table_name} (
+    id INTEGER PRIMARY KEY,
     parent_id INTEGER,
-    move TEXT NOT NULL,
-    white_win_count INTEGER DEFAULT 0,
-    black_win_count INTEGER DEFAULT 0,
-    draw_count INTEGER DEFAULT 0,
-    unfinished_count INTEGER DEFAULT 0,
-    FOREIGN KEY (parent_id) REFERENCES Moves(id)
-)''')
+    move INTEGER NOT NULL,
+    white_win_count INTEGER NOT NULL DEFAULT 0,
+    black_win_count INTEGER NOT NULL DEFAULT 0,
+    draw_count INTEGER NOT NULL DEFAULT 0,
+    unfinished_count INTEGER NOT NULL DEFAULT 0,
+    total INTEGER GENERATED ALWAYS AS
+        (white_win_count + black_win_count + draw_count + unfinished_count) STORED,
+    sibling_rank INTEGER,
+    FOREIGN KEY (parent_id) REFERENCES {table_name}(id)
+)'''
+
+
+# Every lookup is WHERE move = ? AND parent_id IS ?. The index carries the
+# rowid, so it covers lookups that only need the id (insert_move's); reading
+# a node's counts takes one more probe of the table B-tree by rowid. Putting
+# the counts in the index would make every per-ply count update rewrite it
+MOVES_INDEX_SQL = '''CREATE UNIQUE INDEX IF NOT EXISTS idx_moves_parent_move
+    ON Moves (parent_id, move)'''
+
+# Children of a node in popularity order, read straight off the index
+MOVES_TOTAL_INDEX_SQL = '''CREATE INDEX IF NOT EXISTS idx_moves_parent_total
+    ON Moves (parent_id, total DESC)'''
+
+# Interned SAN strings; codes are handed out most frequent move first so
+# the common ones fit in a single byte
+MOVEDICT_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS MoveDict (
+    code INTEGER PRIMARY KEY,
+    san TEXT NOT NULL UNIQUE
+)'''
+
+# Result counts per position, across every move order that reaches it.
+# zobrist is the polyglot hash (as a signed 64-bit integer) and the rowid,
+# so a lookup by board is a single B-tree probe
+POSITIONS_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS Positions (
+    zobrist INTEGER PRIMARY KEY,
+    white_win_count INTEGER NOT NULL DEFAULT 0,
+    black_win_count INTEGER NOT NULL DEFAULT 0,
+    draw_count INTEGER NOT NULL DEFAULT 0,
+    unfinished_count INTEGER NOT NULL DEFAULT 0,
+    total INTEGER GENERATED ALWAYS AS
+        (white_win_count + black_win_count + draw_count + unfinished_count) STORED
+)'''
+
+# One row per game loaded from raw PGN (blake2b of its moves, result and
+# Seven Tag Roster), so append mode counts a game in overlapping dumps once
+GAMEHASHES_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS GameHashes (
+    hash BLOB PRIMARY KEY
+) WITHOUT ROWID'''
+
+# One row counting the transactions that changed the tree; readers key
+# their node cache on it so nodes cached from an older state aren't reused
+TREEVERSION_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS TreeVersion (
+    version INTEGER NOT NULL
+)'''
+
+# How far into each source PGN file the committed batches got, written in
+# the same transaction as the batch so an interrupted load can resume
+INGESTCHECKPOINT_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS IngestCheckpoint (
+    source TEXT PRIMARY KEY,
+    byte_offset INTEGER NOT NULL,
+    games_done INTEGER NOT NULL
+)'''
 
 # Create GameStats table (its not needed )
-cursor.execute('''CREATE TABLE IF NOT EXISTS GameStats (
+GAMESTATS_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS GameStats (
     game_id INTEGER PRIMARY KEY AUTOINCREMENT,
     result TEXT CHECK(result IN ('1-0', '0-1', '1/2-1/2', '*')) NOT NULL
-)''')
+)'''
+
+
+def enable_wal(conn: sqlite3.Connection):
+    """
+    Put the database in write-ahead-log mode (a persistent setting), so readers
+    keep reading the last committed state while a writer appends, instead of
+    failing with 'database is locked'. With WAL, synchronous=NORMAL is still
+    crash safe and skips an fsync per commit (a per-connection setting).
+    """
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+
+
+def bump_tree_version(conn: sqlite3.Connection):
+    """Count one more change to the tree, in the caller's transaction."""
+    conn.execute("UPDATE TreeVersion SET version = version + 1")
+
+
+def create_schema(conn: sqlite3.Connection):
+    """Create the current schema in an empty database."""
+    enable_wal(conn)
+    cursor = conn.cursor()
+    cursor.execute(MOVEDICT_TABLE_SQL)
+    cursor.execute(moves_table_sql())
+    cursor.execute(MOVES_INDEX_SQL)
+    cursor.execute(MOVES_TOTAL_INDEX_SQL)
+    cursor.execute(POSITIONS_TABLE_SQL)
+    cursor.execute(GAMESTATS_TABLE_SQL)
+    cursor.execute(GAMEHASHES_TABLE_SQL)
+    cursor.execute(TREEVERSION_TABLE_SQL)
+    cursor.execute("INSERT INTO TreeVersion (version) VALUES (0)")
+    cursor.execute(INGESTCHECKPOINT_TABLE_SQL)
+    cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.commit()
+
+
+def main():
+    # Connect to the SQLite database
+    conn = sqlite3.connect('chess_game_data2.db')
+
+    # Create MoveDict, Moves, Positions, GameStats, GameHashes, TreeVersion and IngestCheckpoint tables
+    create_schema(conn)
+
+    # Close the connection
+    conn.close()
+
 
-# Commit changes and close the connection
-conn.commit()
-conn.close()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import csv
+import time
+from typing import List, Sequence, Tuple
+import chess
+import chess.engine
+from adaptive_limit import MATE_SCORE, AdaptiveLimit, SearchLimit
+from engine_pool import DEFAULT_HASH_MB, DEFAULT_THREADS, STOCKFISH_PATH, EnginePool
+from eval_cache import cached_analyse
+from sequences import common_sequences, common_sequences_by_count, uncommon_sequences, uncommon_sequences_by_count
+
+COLUMNS = ['Set', 'Sequence', 'Fixed Best Move', 'Fixed Score', 'Fixed Depth', 'Adaptive Best Move', 'Adaptive Score',
+           'Adaptive Depth', 'Score Difference']
+
+
+def positions(sequences: List[List[str]]) -> List[Tuple[Tuple[str, ...], chess.Board]]:
+    """Each distinct sequence with the position after it."""
+    boards = []
+    for sequence in dict.fromkeys(tuple(sequence) for sequence in sequences):
+        board = chess.Board()
+        for move in sequence:
+            board.push_san(move)
+        boards.append((sequence, board))
+    return boards
+
+
+def timed_searches(pool: EnginePool, boards: Sequence[chess.Board], limit: SearchLimit, label: str):
+    """The principal line of every board under limit, and the wall-clock seconds they took on the pool."""
+    start = time.time()
+    # A game key per search sends ucinewgame before each, so no search profits from the hash of another
+    infos = pool.map(lambda engine, task: cached_analyse(engine, task[1], limit, game=(label, task[0])),
+                     list(enumerate(boards)))
+    return infos, time.time() - start
+
+
+def centipawns(info: chess.engine.InfoDict) -> int:
+    return info['score'].relative.score(mate_score=MATE_SCORE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the adaptive search limit against a fixed depth on the "
+                                                 "common and uncommon sequence sets.")
+    parser.add_argument('--depth', type=int, default=30, help="fixed depth, and the adaptive maximum depth")
+    parser.add_argument('--min-depth', type=int, default=AdaptiveLimit._field_defaults['min_depth'])
+    parser.add_argument('--stable-iterations', type=int, default=AdaptiveLimit._field_defaults['stable_iterations'])
+    parser.add_argument('--tolerance', type=int, default=AdaptiveLimit._field_defaults['tolerance_cp'],
+                        help="centipawns the score may move and still count as stable")
+    parser.add_argument('--nodes', type=int, help="node cap of each adaptive search")
+    parser.add_argument('--time', type=float, help="time cap (seconds) of each adaptive search")
+    parser.add_argument('--by-count', action='store_true', help="use the scorediff_t-test sequence sets")
+    parser.add_argument('--engine', default=STOCKFISH_PATH)
+    parser.add_argument('--engines', type=int, help="engine processes (default: one per --threads cores)")
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS, help="search threads per engine")
+    parser.add_argument('--hash', type=int, default=DEFAULT_HASH_MB, help="hash MB per engine")
+    parser.add_argument('--output', default='adaptive_benchmark.csv', help="one row per position")
+    args = parser.parse_args()
+
+    fixed = chess.engine.Limit(depth=args.depth)
+    adaptive = AdaptiveLimit(args.min_depth, args.depth, args.stable_iterations, args.tolerance, args.nodes, args.time)
+    sets = {
+        'Common': common_sequences_by_count if args.by_count else common_sequences,
+        'Uncommon': uncommon_sequences_by_count if args.by_count else uncommon_sequences
+    }
+
+    rows = []
+    with EnginePool(args.engine, args.engines, args.threads, args.hash) as pool:
+        print(f"Fixed {fixed} against {adaptive} on {pool.size} engine(s)")
+        for label, sequences in sets.items():
+            sequences, boards = zip(*positions(sequences))
+            fixed_infos, fixed_seconds = timed_searches(pool, boards, fixed, f"fixed {label}")
+            adaptive_infos, adaptive_seconds = timed_searches(pool, boards, adaptive, f"adaptive {label}")
+
+            differences = []
+            agreed = 0
+            for sequence, board, fixed_info, adaptive_info in zip(sequences, boards, fixed_infos, adaptive_infos):
+                difference = abs(centipawns(adaptive_info) - centipawns(fixed_info))
+                differences.append(difference)
+                agreed += fixed_info['pv'][0] == adaptive_info['pv'][0]
+                rows.append({
+                    'Set': label,
+                    'Sequence': ' '.join(sequence),
+                    'Fixed Best Move': board.san(fixed_info['pv'][0]),
+                    'Fixed Score': centipawns(fixed_info),
+                    'Fixed Depth': fixed_info.get('depth'),
+                    'Adaptive Best Move': board.san(adaptive_info['pv'][0]),
+                    'Adaptive Score': centipawns(adaptive_info),
+                    'Adaptive Depth': adaptive_info.get('depth'),
+                    'Score Difference': difference
+                })
+
+            depths = [info.get('depth') or 0 for info in adaptive_infos]
+            print(f"\n{label}: {len(boards)} positions")
+            print(f"  Fixed:    {fixed_seconds:.1f}s")
+            print(f"  Adaptive: {adaptive_seconds:.1f}s ({1 - adaptive_seconds / fixed_seconds:.0%} saved), "
+                  f"mean depth {sum(depths) / len(depths):.1f}")
+            print(f"  Same best move: {agreed / len(boards):.0%}; score difference mean "
+                  f"{sum(differences) / len(differences):.1f} cp, max {max(differences)} cp, "
+                  f"{sum(difference > args.tolerance for difference in differences)} above the tolerance")
+
+    with open(args.output, 'w', newline='') as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+from typing import Dict, List, NamedTuple, Optional, Union
+import chess
+import chess.engine
+
+MATE_SCORE = 100000  # Centipawns a mate counts as when comparing scores
+
+
+class AdaptiveLimit(NamedTuple):
+    """
+    Search budget that deepens until the evaluation settles: the search
+    stops once the best move has stayed the same and the score within
+    tolerance_cp for stable_iterations consecutive depths (from min_depth
+    on), and at the latest at max_depth, after `nodes` nodes or after
+    `time` seconds. Quiet opening positions settle well before depth 30;
+    tactical ones keep going.
+
+    Its repr is used in evaluation cache keys, so two runs with the same
+    settings share cached results.
+    """
+    min_depth: int = 12
+    max_depth: int = 30
+    stable_iterations: int = 4
+    tolerance_cp: int = 10
+    nodes: Optional[int] = None
+    time: Optional[float] = None
+
+    def engine_limit(self) -> chess.engine.Limit:
+        return chess.engine.Limit(depth=self.max_depth, nodes=self.nodes, time=self.time)
+
+    def is_stable(self, iterations: List[tuple]) -> bool:
+        """Whether the (depth, score, best move) of the iterations so far meet the stopping rule."""
+        if len(iterations) < self.stable_iterations or iterations[-1][0] < self.min_depth:
+            return False
+        recent = iterations[-self.stable_iterations:]
+        scores = [score for _, score, _ in recent]
+        return len({move for _, _, move in recent}) == 1 and max(scores) - min(scores) <= self.tolerance_cp
+
+
+# What the evaluators accept as a search budget
+SearchLimit = Union[chess.engine.Limit, AdaptiveLimit]
+
+
+def _exact(info: chess.engine.InfoDict) -> bool:
+    """An info line with a full score and PV (not a fail-high or fail-low bound)."""
+    return ('depth' in info and 'score' in info and bool(info.get('pv'))
+            and not info.get('lowerbound') and not info.get('upperbound'))
+
+
+def adaptive_analyse(engine: chess.engine.SimpleEngine, board: chess.Board, limit: AdaptiveLimit,
+                     multipv: Optional[int] = None, root_moves: Optional[List[chess.Move]] = None,
+                     game: object = None) -> Union[chess.engine.InfoDict, List[chess.engine.InfoDict]]:
+    """
+    engine.analyse with an AdaptiveLimit: one search, stopped as soon as
+    the limit's stopping rule is met. Returns the lines of the last
+    completed depth, each with the 'depth' it reached; as with
+    engine.analyse, a list if multipv is given and a single line otherwise.
+    """
+    line_count = min(multipv or 1, len(root_moves) if root_moves else board.legal_moves.count())
+    lines: Dict[int, chess.engine.InfoDict] = {}  # Newest exact info of each line
+    completed: List[chess.engine.InfoDict] = []  # Lines of the last depth that every line reached
+    iterations = []
+    with engine.analysis(board, limit.engine_limit(), multipv=multipv, root_moves=root_moves, game=game) as analysis:
+        for info in analysis:
+            if not _exact(info):
+                continue
+            lines[info.get('multipv', 1)] = info
+            if info.get('multipv', 1) != line_count or 1 not in lines or info['depth'] != lines[1]['depth']:
+                continue
+            # Every line has reported this depth
+            completed = [lines[index] for index in range(1, line_count + 1)]
+            best = completed[0]
+            iterations.append((best['depth'], best['score'].relative.score(mate_score=MATE_SCORE), best['pv'][0]))
+            if limit.is_stable(iterations):
+                break
+        analysis.stop()
+        analysis.wait()
+        if not completed:
+            completed = analysis.multipv  # Capped before any depth completed
+    return completed if multipv is not None else completed[0]
@@ -0,0 +1,151 @@
+import math
+from typing import List, NamedTuple, Optional
+import chess
+import chess.engine
+from adaptive_limit import SearchLimit
+from eval_cache import EvalCache, cached_analyse
+
+DEFAULT_MULTIPV = 5  # Engine lines a candidate move is ranked among
+
+# Centipawn losses above which a move is a blunder or a mistake
+BLUNDER_CP = 300
+MISTAKE_CP = 100
+
+# Scores are clamped to this many centipawns (mates included) before taking
+# losses, so a missed mate or a lost position doesn't swamp a game's average
+CP_CAP = 1000
+
+
+class CandidateEval(NamedTuple):
+    """
+    A candidate move against the engine's choice, both scored from the
+    point of view of the side making the move, under the same limit.
+    rank is the candidate's place among the engine's best lines (1 for its
+    best move), or None if it is outside them; depth is the depth the
+    search of the best lines reached.
+    """
+    best_move: chess.Move
+    best_score: chess.engine.Score
+    score: chess.engine.Score
+    rank: Optional[int]
+    depth: Optional[int]
+
+    def centipawn_loss(self, mate_score: Optional[int] = None) -> Optional[int]:
+        """How much worse the candidate scores than the best move, or None if either is a mate (without mate_score)."""
+        best, candidate = self.best_score.score(mate_score=mate_score), self.score.score(mate_score=mate_score)
+        if best is None or candidate is None:
+            return None
+        return max(0, best - candidate)
+
+
+def evaluate_candidate(engine: chess.engine.SimpleEngine, board: chess.Board, move: chess.Move,
+                       limit: SearchLimit, multipv: int = DEFAULT_MULTIPV,
+                       cache: Optional[EvalCache] = None) -> Optional[CandidateEval]:
+    """
+    Score move in board's position against the engine's best move with a
+    single MultiPV search, rather than one search of the position and
+    another after the move. If the move isn't among the multipv best lines,
+    it is scored by a second search restricted to it (UCI searchmoves).
+    Returns None if the engine gave no scored line.
+    """
+    lines = [info for info in cached_analyse(engine, board, limit, cache, multipv) if 'score' in info and info.get('pv')]
+    if not lines:
+        return None
+    best = lines[0]
+    rank = next((i for i, info in enumerate(lines, start=1) if info['pv'][0] == move), None)
+    if rank is not None:
+        candidate = lines[rank - 1]
+    else:
+        candidate = cached_analyse(engine, board, limit, cache, root_moves=[move])
+        if 'score' not in candidate:
+            return None
+    return CandidateEval(best['pv'][0], best['score'].relative, candidate['score'].relative, rank, best.get('depth'))
+
+
+def classify_loss(centipawn_loss: int) -> str:
+    """'Blunder', 'Mistake' or 'Good' for a move losing this many centipawns."""
+    if centipawn_loss > BLUNDER_CP:
+        return 'Blunder'
+    if centipawn_loss > MISTAKE_CP:
+        return 'Mistake'
+    return 'Good'
+
+
+def win_percent(centipawns: int) -> float:
+    """Winning chances (0-100) of the side with this score, as on Lichess."""
+    return 50 + 50 * (2 / (1 + math.exp(-0.00368208 * centipawns)) - 1)
+
+
+def move_accuracy(win_before: float, win_after: float) -> float:
+    """Accuracy (0-100) of a move taking the mover's winning chances from win_before to win_after, as on Lichess."""
+    return max(0.0, min(100.0, 103.1668 * math.exp(-0.04354 * max(0.0, win_before - win_after)) - 3.1669))
+
+
+class PlyEval(NamedTuple):
+    """
+    One move of a game: the mover's score before it (best play) and after
+    it, in capped centipawns, and the depth the search before it reached.
+    """
+    ply: int
+    color: chess.Color
+    move: str
+    best_move: Optional[str]
+    score_before: int
+    score_after: int
+    depth: Optional[int]
+
+    @property
+    def centipawn_loss(self) -> int:
+        return max(0, self.score_before - self.score_after)
+
+    @property
+    def accuracy(self) -> float:
+        return move_accuracy(win_percent(self.score_before), win_percent(self.score_after))
+
+
+def _capped(score: chess.engine.Score) -> int:
+    return max(-CP_CAP, min(CP_CAP, score.score(mate_score=100 * CP_CAP)))
+
+
+def _position_score(engine: chess.engine.SimpleEngine, board: chess.Board, limit: SearchLimit,
+                    cache: Optional[EvalCache], game: object):
+    """Capped score of the side to move, the engine's best move and the depth reached (None once the game is over)."""
+    if board.is_checkmate():
+        return -CP_CAP, None, None
+    if board.is_game_over(claim_draw=False):
+        return 0, None, None
+    info = cached_analyse(engine, board, limit, cache, game=game)
+    best_move = board.san(info['pv'][0]) if info.get('pv') else None
+    return _capped(info['score'].relative), best_move, info.get('depth')
+
+
+def evaluate_game(engine: chess.engine.SimpleEngine, moves: List[str], limit: SearchLimit,
+                  cache: Optional[EvalCache] = None, game: object = None) -> List[PlyEval]:
+    """
+    Evaluate every move of a game (SAN moves from the start position).
+
+    The mover's score after a move is minus the opponent's score in the
+    next position, so each position is searched once and its score serves
+    both as the "before" of its own move and the "after" of the previous
+    one (evaluate_candidate searches twice per move when the move is
+    outside the top lines). The positions are analyzed in game order on
+    the same engine, with one ucinewgame per game (the `game` key), so the
+    engine's hash carries over from one ply to the next.
+
+    Stops at the first move that isn't legal.
+    """
+    board = chess.Board()
+    plies = []
+    score, best_move, depth = _position_score(engine, board, limit, cache, game)
+    for ply, san in enumerate(moves, start=1):
+        try:
+            move = board.parse_san(san)
+        except ValueError:
+            print(f"Illegal move {san!r} at ply {ply}; evaluating the game up to it")
+            break
+        color = board.turn
+        board.push(move)
+        next_score, next_best_move, next_depth = _position_score(engine, board, limit, cache, game)
+        plies.append(PlyEval(ply, color, san, best_move, score, -next_score, depth))
+        score, best_move, depth = next_score, next_best_move, next_depth
+    return plies
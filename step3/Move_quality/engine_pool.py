@@ -0,0 +1,111 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional, TypeVar
+import chess
+import chess.engine
+
+# Path to Stockfish engine
+STOCKFISH_PATH = "/opt/homebrew/bin/stockfish"
+
+DEFAULT_THREADS = 1  # Search threads per engine
+DEFAULT_HASH_MB = 64  # Transposition table per engine
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+# Failures meaning the engine process died, which a fresh process recovers from. An
+# EngineError of a live engine (e.g. one refusing a position) would fail again on retry
+RESTARTABLE_ERRORS = (chess.engine.EngineTerminatedError, BrokenPipeError)
+
+
+class EnginePool:
+    """
+    `size` UCI engine processes evaluating positions in parallel.
+
+    Each engine runs with `threads` search threads and `hash_mb` MB of hash
+    (plus any other UCI `options`); by default there is one engine per
+    `threads` cores, so the pool keeps every core busy. Work is handed to
+    whichever engine is idle. An engine process that dies is replaced by a
+    fresh one and its task retried, up to `retries` times; any other error
+    goes straight to the caller. Searches have no timeout, so an engine
+    that hangs without exiting isn't detected.
+
+    Use it as a context manager so the engine processes are shut down:
+
+        with EnginePool(STOCKFISH_PATH, threads=2, hash_mb=256) as pool:
+            infos = pool.analyse_many(boards, chess.engine.Limit(depth=20))
+    """
+
+    def __init__(self, engine_path: str = STOCKFISH_PATH, size: Optional[int] = None, threads: int = DEFAULT_THREADS,
+                 hash_mb: int = DEFAULT_HASH_MB, options: Optional[dict] = None, retries: int = 2):
+        self.engine_path = engine_path
+        self.size = size or max(1, (os.cpu_count() or 1) // threads)
+        self.options = dict(options or {}, Threads=threads, Hash=hash_mb)
+        self.retries = retries
+        self.restarts = 0
+        self._lock = threading.Lock()
+        self._engines = [self._start_engine() for _ in range(self.size)]
+        self._idle: queue.Queue = queue.Queue()
+        for engine in self._engines:
+            self._idle.put(engine)
+        self._executor = ThreadPoolExecutor(max_workers=self.size)
+
+    def __enter__(self) -> 'EnginePool':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _start_engine(self) -> chess.engine.SimpleEngine:
+        engine = chess.engine.SimpleEngine.popen_uci(self.engine_path)
+        engine.configure({name: value for name, value in self.options.items() if name in engine.options})
+        return engine
+
+    def _restart(self, engine: chess.engine.SimpleEngine) -> chess.engine.SimpleEngine:
+        """Replace a failed engine by a new process."""
+        try:
+            engine.close()
+        except Exception:
+            pass  # Already dead
+        replacement = self._start_engine()
+        with self._lock:
+            self._engines[self._engines.index(engine)] = replacement
+            self.restarts += 1
+        return replacement
+
+    def run(self, task: Callable[[chess.engine.SimpleEngine], R]) -> R:
+        """Run task(engine) on an idle engine, blocking until one is free."""
+        engine = self._idle.get()
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    return task(engine)
+                except RESTARTABLE_ERRORS as e:
+                    print(f"Engine failed ({type(e).__name__}: {e}); restarting it")
+                    engine = self._restart(engine)
+                    if attempt == self.retries:
+                        raise
+        finally:
+            self._idle.put(engine)
+
+    def map(self, task: Callable[[chess.engine.SimpleEngine, T], R], items: Iterable[T]) -> List[R]:
+        """task(engine, item) for every item, spread over the engines; results are in input order."""
+        return list(self._executor.map(lambda item: self.run(lambda engine: task(engine, item)), items))
+
+    def analyse(self, board: chess.Board, limit: chess.engine.Limit, **kwargs) -> chess.engine.InfoDict:
+        """SimpleEngine.analyse on an idle engine."""
+        return self.run(lambda engine: engine.analyse(board, limit, **kwargs))
+
+    def analyse_many(self, boards: Iterable[chess.Board], limit: chess.engine.Limit, **kwargs) -> list:
+        """SimpleEngine.analyse of every board, in input order."""
+        return self.map(lambda engine, board: engine.analyse(board, limit, **kwargs), boards)
+
+    def close(self):
+        self._executor.shutdown()
+        for engine in self._engines:
+            try:
+                engine.quit()
+            except Exception:
+                pass  # Already dead
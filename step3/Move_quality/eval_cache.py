@@ -0,0 +1,171 @@
+import json
+import sqlite3
+import threading
+from typing import List, Optional, Union
+import chess
+import chess.engine
+from adaptive_limit import AdaptiveLimit, SearchLimit, adaptive_analyse
+
+DEFAULT_CACHE_PATH = 'eval_cache.db'
+DEFAULT_MAX_ENTRIES = 1_000_000
+EVICT_FRACTION = 0.1  # Share of the entries dropped at once when the cache is full
+
+CACHE_SCHEMA_SQL = '''
+CREATE TABLE IF NOT EXISTS Evaluations (
+    key TEXT PRIMARY KEY,
+    lines TEXT NOT NULL,    -- JSON list of {"cp" | "mate": white's score, "depth", "pv": [UCI moves]}, best line first
+    last_used INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_evaluations_last_used ON Evaluations (last_used);
+'''
+
+
+def normalized_fen(board: chess.Board) -> str:
+    """The position without its move counters, so transpositions share an entry."""
+    return board.epd()
+
+
+def engine_name(engine: chess.engine.SimpleEngine) -> str:
+    """The engine's UCI id name, which for Stockfish includes its version."""
+    return engine.id.get('name', 'unknown engine')
+
+
+def cache_key(board: chess.Board, engine: chess.engine.SimpleEngine, limit: SearchLimit,
+              multipv: Optional[int], root_moves: Optional[List[chess.Move]] = None) -> str:
+    key = f"{normalized_fen(board)}|{engine_name(engine)}|{limit!r}|{multipv or 1}"
+    if root_moves:
+        key += "|" + " ".join(sorted(move.uci() for move in root_moves))
+    return key
+
+
+def _encode_line(info: chess.engine.InfoDict) -> dict:
+    score = info['score'].white()
+    line = {'mate': score.mate()} if score.is_mate() else {'cp': score.score()}
+    line['depth'] = info.get('depth')
+    line['pv'] = [move.uci() for move in info.get('pv', [])]
+    return line
+
+
+def _decode_line(line: dict, turn: chess.Color) -> chess.engine.InfoDict:
+    score = chess.engine.Mate(line['mate']) if 'mate' in line else chess.engine.Cp(line['cp'])
+    # Seen from the side to move, like the engine's own scores
+    score = chess.engine.PovScore(score, chess.WHITE).pov(turn)
+    return {
+        'score': chess.engine.PovScore(score, turn),
+        'depth': line['depth'],
+        'pv': [chess.Move.from_uci(move) for move in line['pv']]
+    }
+
+
+class EvalCache:
+    """
+    Engine evaluations kept on disk across runs, keyed by (normalized FEN,
+    engine name and version, limit, multipv and any searchmoves). Each
+    entry holds the score, depth and PV of every line, the best move being
+    the first move of the first PV. Once the cache holds more than
+    max_entries positions, the least recently used tenth is dropped.
+
+    Entries are stored as white's score and rebuilt as a PovScore of the
+    side to move, so they read the same as a fresh engine.analyse. A
+    position is cached without its move history; with a repetition in the
+    game the engine might have scored it differently.
+
+    Safe to share between the threads of an EnginePool.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.executescript(CACHE_SCHEMA_SQL)
+        self._lock = threading.Lock()
+        self.size, self.clock = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(MAX(last_used), 0) FROM Evaluations").fetchone()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __enter__(self) -> 'EvalCache':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get(self, key: str, turn: chess.Color) -> Optional[List[chess.engine.InfoDict]]:
+        with self._lock:
+            row = self.conn.execute("SELECT lines FROM Evaluations WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.clock += 1
+            self.conn.execute("UPDATE Evaluations SET last_used = ? WHERE key = ?", (self.clock, key))
+            self.conn.commit()
+        return [_decode_line(line, turn) for line in json.loads(row[0])]
+
+    def put(self, key: str, infos: List[chess.engine.InfoDict]):
+        lines = json.dumps([_encode_line(info) for info in infos if 'score' in info])
+        with self._lock:
+            self.clock += 1
+            existed = self.conn.execute("SELECT 1 FROM Evaluations WHERE key = ?", (key,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO Evaluations (key, lines, last_used) VALUES (?, ?, ?)",
+                              (key, lines, self.clock))
+            if not existed:
+                self.size += 1
+            if self.size > self.max_entries:
+                self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """Drop the least recently used entries."""
+        drop = self.size - self.max_entries + int(self.max_entries * EVICT_FRACTION)
+        self.conn.execute("DELETE FROM Evaluations WHERE key IN "
+                          "(SELECT key FROM Evaluations ORDER BY last_used LIMIT ?)", (drop,))
+        self.size -= drop
+        self.evictions += drop
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM Evaluations")
+            self.conn.commit()
+            self.size = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': self.size,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def close(self):
+        self.conn.close()
+
+
+def cached_analyse(engine: chess.engine.SimpleEngine, board: chess.Board, limit: SearchLimit,
+                   cache: Optional[EvalCache] = None, multipv: Optional[int] = None,
+                   root_moves: Optional[List[chess.Move]] = None, game: object = None
+                   ) -> Union[chess.engine.InfoDict, List[chess.engine.InfoDict]]:
+    """
+    engine.analyse(board, limit, multipv=multipv, root_moves=root_moves,
+    game=game), answered from the cache when the position was analyzed
+    before with the same engine and limit. An AdaptiveLimit runs
+    adaptive_analyse instead. As with engine.analyse, returns a list of
+    lines if multipv is given and a single line otherwise.
+    """
+    key = cache_key(board, engine, limit, multipv, root_moves) if cache is not None else None
+    infos = cache.get(key, board.turn) if cache is not None else None
+    if infos is None:
+        if isinstance(limit, AdaptiveLimit):
+            result = adaptive_analyse(engine, board, limit, multipv=multipv, root_moves=root_moves, game=game)
+        else:
+            result = engine.analyse(board, limit, multipv=multipv, root_moves=root_moves, game=game)
+        infos = result if multipv is not None else [result]
+        if cache is not None:
+            cache.put(key, infos)
+    return infos if multipv is not None else infos[0]
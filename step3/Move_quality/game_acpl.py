@@ -0,0 +1,109 @@
+import argparse
+import csv
+import os
+import time
+from typing import List
+import chess
+import chess.engine
+from adaptive_limit import AdaptiveLimit
+from engine_eval import PlyEval, classify_loss, evaluate_game
+from engine_pool import DEFAULT_HASH_MB, DEFAULT_THREADS, STOCKFISH_PATH, EnginePool
+from eval_cache import DEFAULT_CACHE_PATH, EvalCache
+
+# Stockfish played white and Gemini black in the Step-1 sessions
+GEMINI_COLOR = chess.BLACK
+DEFAULT_GAMES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Step-1', '1752games.txt')
+
+GAME_COLUMNS = ['Game', 'Plies', 'Gemini Moves', 'Gemini ACPL', 'Gemini Accuracy', 'Blunders', 'Mistakes',
+                'Stockfish ACPL', 'Mean Depth']
+PLY_COLUMNS = ['Game', 'Ply', 'Side', 'Move', 'Best Move', 'Score Before', 'Score After', 'Centipawn Loss',
+               'Accuracy', 'Move Quality', 'Depth']
+
+
+def read_games(games_file: str) -> List[List[str]]:
+    """The SAN moves of every game, one comma-separated game per line."""
+    with open(games_file, 'r') as infile:
+        return [[move.strip() for move in line.split(',') if move.strip()] for line in infile if line.strip()]
+
+
+def summarize_game(game_no: int, plies: List[PlyEval]) -> dict:
+    """ACPL, mean accuracy and blunder and mistake counts of Gemini's moves in one game."""
+    gemini = [ply for ply in plies if ply.color == GEMINI_COLOR]
+    stockfish = [ply for ply in plies if ply.color != GEMINI_COLOR]
+    qualities = [classify_loss(ply.centipawn_loss) for ply in gemini]
+    depths = [ply.depth for ply in plies if ply.depth is not None]
+    return {
+        'Game': game_no,
+        'Plies': len(plies),
+        'Gemini Moves': len(gemini),
+        'Gemini ACPL': round(sum(ply.centipawn_loss for ply in gemini) / len(gemini), 1) if gemini else None,
+        'Gemini Accuracy': round(sum(ply.accuracy for ply in gemini) / len(gemini), 1) if gemini else None,
+        'Blunders': qualities.count('Blunder'),
+        'Mistakes': qualities.count('Mistake'),
+        'Stockfish ACPL': round(sum(ply.centipawn_loss for ply in stockfish) / len(stockfish), 1) if stockfish else None,
+        'Mean Depth': round(sum(depths) / len(depths), 1) if depths else None
+    }
+
+
+def ply_rows(game_no: int, plies: List[PlyEval]) -> List[dict]:
+    return [{
+        'Game': game_no,
+        'Ply': ply.ply,
+        'Side': 'Gemini' if ply.color == GEMINI_COLOR else 'Stockfish',
+        'Move': ply.move,
+        'Best Move': ply.best_move,
+        'Score Before': ply.score_before,
+        'Score After': ply.score_after,
+        'Centipawn Loss': ply.centipawn_loss,
+        'Accuracy': round(ply.accuracy, 1),
+        'Move Quality': classify_loss(ply.centipawn_loss),
+        'Depth': ply.depth
+    } for ply in plies]
+
+
+def write_rows(filename: str, columns: List[str], rows: List[dict]):
+    with open(filename, 'w', newline='') as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Results saved to {filename}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Centipawn loss and accuracy of every Gemini move of the Step-1 games.")
+    parser.add_argument('games_file', nargs='?', default=DEFAULT_GAMES_FILE)
+    parser.add_argument('--output', default='game_acpl.csv', help="one row per game")
+    parser.add_argument('--plies-output', help="also write one row per ply to this file")
+    parser.add_argument('--depth', type=int, default=15, help="search depth, or the maximum depth with --adaptive")
+    parser.add_argument('--adaptive', action='store_true', help="stop each search early once its evaluation is stable")
+    parser.add_argument('--engine', default=STOCKFISH_PATH)
+    parser.add_argument('--engines', type=int, help="engine processes (default: one per --threads cores)")
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS, help="search threads per engine")
+    parser.add_argument('--hash', type=int, default=DEFAULT_HASH_MB, help="hash MB per engine")
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH, help="evaluation cache file, '' to disable")
+    args = parser.parse_args()
+
+    games = read_games(args.games_file)
+    limit = AdaptiveLimit(max_depth=args.depth) if args.adaptive else chess.engine.Limit(depth=args.depth)
+    cache = EvalCache(args.cache) if args.cache else None
+    start = time.time()
+    try:
+        with EnginePool(args.engine, args.engines, args.threads, args.hash) as pool:
+            # One game per task: its plies run in order on one engine, which keeps its hash between them
+            evaluations = pool.map(lambda engine, game: evaluate_game(engine, game[1], limit, cache, game=game[0]),
+                                   list(enumerate(games, start=1)))
+    finally:
+        if cache is not None:
+            print(f"Evaluation cache: {cache.stats()}")
+            cache.close()
+    print(f"Evaluated {len(games)} games in {time.time() - start:.1f}s")
+
+    write_rows(args.output, GAME_COLUMNS,
+               [summarize_game(game_no, plies) for game_no, plies in enumerate(evaluations, start=1)])
+    if args.plies_output:
+        write_rows(args.plies_output, PLY_COLUMNS,
+                   [row for game_no, plies in enumerate(evaluations, start=1) for row in ply_rows(game_no, plies)])
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,10 @@ import time
 import pandas as pd
 import matplotlib.pyplot as plt
 from scipy.stats import ttest_ind, f_oneway
+from engine_pool import RESTARTABLE_ERRORS, EnginePool
+from engine_eval import classify_loss, evaluate_candidate
+from eval_cache import EvalCache
+from sequences import common_sequences_by_count as common_sequences, uncommon_sequences_by_count as uncommon_sequences
 # https://python-chess.readthedocs.io/en/latest/engine.html
 
 # Configure Gemini API
@@ -14,93 +18,8 @@ genai.configure(api_key=api_key)
 # Path to Stockfish engine
 STOCKFISH_PATH = "/opt/homebrew/bin/stockfish"
 
-# Common and uncommon sequences # min 5 digits or more  for common
-common_sequences =[
-
-    ['e4','c5','Nf3'],
-    ['e4','c5','Nf3','d6'],
-    ['e4', 'e5', 'Nf3', 'Nc6'],  # Ruy-Lopez
-    ['e4', 'e5', 'Nf3', 'Nc6', 'Bc4'],  # Italian Game
-    ['e4', 'c5'],                       # Sicilian Defense
-    ['e4', 'e6'],                       # French Defense
-    ['e4'],                       # Caro-Kann Defense
-    ['e4', 'd6', 'd4'],          # Pirc Defense
-    ['d4', 'd5'],                 # Queen's Gambit
-    ['d4', 'Nf6', 'c4'],          # King's Indian Defense
-    ['d4', 'Nf6', 'c4', 'e6', 'Nc3'],  # Nimzo-Indian Defense
-    ['d4', 'Nf6', 'c4', 'g6', 'Nc3'],   # Grünfeld Defense
-    ['d4', 'd5'],                # London System
-    ['d4', 'd5', 'c4'],           # Slav Defense
-    ['c4'],                             # English Opening
-    ['e4', 'd5'],                       # Scandinavian Defense
-    ['e4', 'e5', 'Nc3'],                # Vienna Game
-    ['d4', 'f5'],                       # Dutch Defense
-    ['e4', 'Nf6'],                      # Alekhine's Defense
-    ['e4', 'g6'],                       # Modern Defense
-    ['d4', 'Nf6', 'c4', 'c5'],          # Benoni Defense
-    ['d4', 'd5', 'e3'],                 # Stonewall Attack
-    ['f4'],                             # Bird’s Opening
-    ['Nf3'],                            # Reti Opening
-    ['d4', 'Nf6', 'c4', 'e6', 'g3'],    # Catalan Opening
-    ['e4', 'e5', 'f4'],                 # King’s Gambit
-    ['e4', 'e5', 'Nf3', 'Nc6', 'Nc3'],  # Four Knights Game
-    ['e4', 'e5', 'Nf3', 'Nf6'],         # Petrov's Defense
-    ['e4', 'e5', 'Nf3', 'Nc6', 'Bc4'],  # Giuoco Piano
-    ['e4', 'e5', 'Nf3', 'Nc6', 'Bc4', 'Bc5'],  # Evans Gambit
-    ['d4', 'Nf6', 'Bg5'],               # Trompowsky Attack
-    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'Nf6'],  # Back-Rank Setup
-    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5'],  # Knight Fork Idea
-    ['e4', 'e5', 'Nf3', 'Nc6', 'd4'],  # Smothered Mate Setup
-    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'Nf6', 'O-O'],  # Double Check Setup
-    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'd6'],  # Windmill Setup
-    ['e4', 'e5', 'd4', 'exd4'],  # En passant Setup
-    ['e4', 'e5', 'Nf3', 'Nc6', 'd4'],  # Overloading Setup
-    ['e4', 'e5', 'Nf3', 'Nc6', 'd4', 'exd4'],  # Trapped Piece Setup
-    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4'],  # Zwischenzug Setup
-]
-
-uncommon_sequences = [ # max count in db is upto 4 digits so <=4
-   ['g4'],         #Grob Opening                    
-    ['e4', 'e5', 'Nf3', 'Nc6', 'Be2'],  
-    ['e4', 'e5', 'Nf3', 'd5'],          
-    ['e4', 'e5', 'Nf3', 'f5'],          
-    ['d4', 'd5', 'e4'],              
-    ['d4', 'e5'],                    
-    ['a4'],                           
-    ['e4', 'e5', 'Ke2'],                # Bongcloud Attack
-    ['e4', 'a6'],                       # St. George Defense
-    ['h4'],                             # Kadas Opening
-    ['e4', 'e5', 'Nf3', 'f6'],          # Damiano Defense
-    ['e4', 'e5', 'Nf3', 'Nc6', 'Nxe5'], # Irish Gambit
-    ['e4', 'b6', 'd4', 'g6', 'Nf3', 'Bg7'],  # Hippopotamus Defense
-    ['e4', 'e6', 'd4', 'd5', 'Nd2', 'h6'],  # Czech Defense
-    ['e4', 'g6', 'Bc4', 'Bg7', 'Qf3'],  # Monkey's Bum
-    ['e4', 'e5', 'Nf3', 'Nc6', 'Bc4', 'Bc5', 'Bxf7+'],  # Jerome Gambit
-    ['e4', 'e5', 'Nf3', 'Nc6', 'Nc3', 'Nf6', 'Nxe5'],   # Halloween Gambit
-    ['e4', 'e5', 'd4', 'exd4', 'c3', 'dxc3', 'bxc3', 'd5'],  # Underpromotion Setup
-    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'd6', 'd4', 'exd4'],  # Stalemate Sacrifice Setup
-    ['e4', 'e5', 'Nf3', 'Nc6', 'd4', 'exd4', 'c3'],         # Fortress Setup
-    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'd6', 'd4'],          # Trojan Horse Setup
-    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'b5'],   # Staircase Mate Setup
-    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'Nf6', 'O-O', 'a6'],  # Corridor Mate Setup
-    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'd5'],   # Damiano Mate Setup
-    ['e4', 'e5', 'd4', 'exd4', 'c3'],                      # Battering Ram Setup
-    ['g3', 'd5', 'Bg2', 'c6'],                             # Hypermodern Opening
-    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'd4'],         # Intermezzo Sacrifice Setup
-    ['e4', 'f6'],                     # Barnes Opening
-    ['Nh3'],                          # Amar Opening
-    ['a3'],                           # Anderssen Opening
-    ['Na3'],                          # Durkin Opening
-    ['h3'],                           # Clemenz Opening
-    ['a4', 'e5'],                     # Desprez Opening
-    ['e4', 'e5', 'Qh5'],              # King's Head Opening
-    ['e4', 'f5'],                     # Fried Fox Defense
-    ['e4', 'd5', 'Nf3'],              # Tennison Gambit
-    ['f3', 'e5', 'g4', 'Qh4#'],       # Hammerschlag Opening (Fool's Mate)
-    ['h3', 'a5'],                     # Creepy Crawly Opening
-    ['g4', 'h5'],                     # Toilet Variation
-    ['b4', 'd5']
-]
+# Search budget per position; adaptive_limit.AdaptiveLimit(max_depth=15) stops early once the evaluation is stable
+SEARCH_LIMIT = chess.engine.Limit(depth=15)
 
 def get_gemini_move(sequence):
     """
@@ -117,9 +36,10 @@ def get_gemini_move(sequence):
         print(f"Error getting move from Gemini: {e}")
         return None
 
-def evaluate_move_with_stockfish(stockfish, sequence, gemini_move):
+def evaluate_move_with_stockfish(stockfish, sequence, gemini_move, cache=None):
     """
-    Evaluate Gemini's move using Stockfish and calculate centipawn difference, legality, and probability shift.
+    Evaluate Gemini's move using Stockfish and calculate centipawn difference, legality, probability shift,
+    best score and the depth the search reached.
     """
     board = chess.Board()
     for move in sequence:
@@ -127,71 +47,63 @@ def evaluate_move_with_stockfish(stockfish, sequence, gemini_move):
             board.push_san(move)
         except ValueError:
             print(f"Invalid move in sequence: {move}")
-            return None, None, None, None
+            return None, None, None, None, None
 
     legal_moves = [board.san(move) for move in board.legal_moves]
     if not gemini_move or gemini_move not in legal_moves:
         print(f"Gemini's move '{gemini_move}' is not a legal move.")
-        return None, False, None, None
-
-    # Evaluate using Stockfish
-    with stockfish.analysis(board, chess.engine.Limit(depth=15)) as analysis:
-        best_score = None
-        gemini_score = None
-        pre_prob = None
-        post_prob = None
-
-        # Get best score from Stockfish analysis
-        for info in analysis:
-            if "pv" in info and "score" in info:
-                best_score = info["score"].relative.score()
-                pre_prob = 1 / (1 + 10 ** (-best_score / 400)) if best_score is not None else None
-                break
+        return None, False, None, None, None
 
-        # Check if best_score is valid
-        if best_score is None:
-            print("Best score from Stockfish is None. Skipping.")
-            return None, True, None, None
+    # Score the best move and Gemini's move in one search, both from the mover's side
+    try:
+        evaluation = evaluate_candidate(stockfish, board, board.parse_san(gemini_move), SEARCH_LIMIT, cache=cache)
+    except RESTARTABLE_ERRORS:
+        raise  # The pool restarts the engine and retries
+    except Exception as e:
+        print(f"Error evaluating Gemini's move: {e}")
+        return None, True, None, None, None
 
-        # Evaluate Gemini's move
-        try:
-            gemini_move_obj = board.parse_san(gemini_move)
-            board.push(gemini_move_obj)
-            gemini_analysis = stockfish.analyse(board, chess.engine.Limit(depth=15))
-            gemini_score = gemini_analysis["score"].relative.score() if "score" in gemini_analysis else None
-            post_prob = 1 / (1 + 10 ** (-gemini_score / 400)) if gemini_score is not None else None
-        except Exception as e:
-            print(f"Error evaluating Gemini's move: {e}")
-            return None, True, None, None
+    best_score = evaluation.best_score.score() if evaluation else None
+    gemini_score = evaluation.score.score() if evaluation else None
 
-        # Check if gemini_score is valid
-        if gemini_score is None:
-            print("Gemini's score from Stockfish is None. Skipping.")
-            return None, True, None, None
+    # Check if the scores are valid
+    if best_score is None or gemini_score is None:
+        print("Stockfish gave no centipawn score. Skipping.")
+        return None, True, None, None, None
 
-        centipawn_diff = best_score - gemini_score
-        prob_shift = post_prob - pre_prob if post_prob is not None and pre_prob is not None else None
+    pre_prob = 1 / (1 + 10 ** (-best_score / 400))
+    post_prob = 1 / (1 + 10 ** (-gemini_score / 400))
+    centipawn_diff = evaluation.centipawn_loss()
+    prob_shift = post_prob - pre_prob
 
-        return centipawn_diff, True, prob_shift, best_score
+    return centipawn_diff, True, prob_shift, best_score, evaluation.depth
 
 
-def analyze_sequences(stockfish, sequences, label):
+def analyze_sequences(pool, sequences, label, cache=None):
     """
-    Analyze sequences and calculate metrics.
+    Analyze sequences and calculate metrics. Gemini is asked first, one
+    sequence at a time to respect its rate limit; the suggested moves are
+    then evaluated together on the engine pool, skipping the positions
+    already in the evaluation cache.
     """
-    results = []
+    gemini_moves = []
     for i, sequence in enumerate(sequences, start=1):
         print(f"Analyzing {label} sequence {i}: {sequence}")
-        gemini_move = get_gemini_move(sequence)
-        if gemini_move:
-            centipawn_diff, is_legal, prob_shift, best_score = evaluate_move_with_stockfish(stockfish, sequence, gemini_move)
-            results.append({
-                'Sequence': ' '.join(sequence),
-                'Centipawn Difference': centipawn_diff,
-                'Is Legal': is_legal,
-                'Win Probability Shift': prob_shift,
-                'Best Score': best_score
-            })
+        gemini_moves.append(get_gemini_move(sequence))
+
+    asked = [(sequence, gemini_move) for sequence, gemini_move in zip(sequences, gemini_moves) if gemini_move]
+    evaluations = pool.map(lambda stockfish, task: evaluate_move_with_stockfish(stockfish, *task, cache), asked)
+
+    results = []
+    for (sequence, _), (centipawn_diff, is_legal, prob_shift, best_score, depth) in zip(asked, evaluations):
+        results.append({
+            'Sequence': ' '.join(sequence),
+            'Centipawn Difference': centipawn_diff,
+            'Is Legal': is_legal,
+            'Win Probability Shift': prob_shift,
+            'Best Score': best_score,
+            'Depth': depth
+        })
     return results
 
 def classify_moves(results):
@@ -200,12 +112,7 @@ def classify_moves(results):
     """
     for result in results:
         if result['Centipawn Difference'] is not None:
-            if result['Centipawn Difference'] > 300:
-                result['Move Quality'] = 'Blunder'
-            elif 100 < result['Centipawn Difference'] <= 300:
-                result['Move Quality'] = 'Mistake'
-            else:
-                result['Move Quality'] = 'Good'
+            result['Move Quality'] = classify_loss(result['Centipawn Difference'])
     return results
 
 def save_to_file(results, filename):
@@ -263,11 +170,11 @@ def plot_results(common_results, uncommon_results):
     plt.show()
 
 def main():
-    stockfish = chess.engine.SimpleEngine.popen_uci(STOCKFISH_PATH)
-
     # Analyze common and uncommon sequences
-    common_results = analyze_sequences(stockfish, common_sequences, "Common")
-    uncommon_results = analyze_sequences(stockfish, uncommon_sequences, "Uncommon")
+    with EnginePool(STOCKFISH_PATH) as pool, EvalCache() as cache:
+        common_results = analyze_sequences(pool, common_sequences, "Common", cache)
+        uncommon_results = analyze_sequences(pool, uncommon_sequences, "Uncommon", cache)
+        print(f"Evaluation cache: {cache.stats()}")
 
     # Classify moves
     common_results = classify_moves(common_results)
@@ -287,7 +194,5 @@ def main():
     # Plot results
     plot_results(common_results, uncommon_results)
 
-    stockfish.quit()
-
 if __name__ == "__main__":
     main()
@@ -1,38 +1,25 @@
-import sqlite3
+import os
+import sys
 from typing import List, Optional
 
-class ChessDatabase:
-    def __init__(self, db_path: str):
-        self.db_path = db_path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from explorer_service import open_explorer
+from opening_tree import OpeningTree
 
+class ChessDatabase(OpeningTree):
     def get_statistics(self, move_sequence: List[str]) -> Optional[dict]:
         """Get cumulative statistics for a move sequence."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            parent_id = None
+        walk = self.walk_prefixes([move_sequence])[0]
+        if not walk or len(walk) < len(move_sequence):
+            return None
 
-            for move in move_sequence:
-                cursor.execute("""
-                    SELECT id, white_win_count, black_win_count, 
-                           draw_count, unfinished_count
-                    FROM Moves 
-                    WHERE move = ? AND parent_id IS ?
-                """, (move, parent_id))
-
-                row = cursor.fetchone()
-                if not row:
-                    return None
-
-                parent_id = row[0]
-                
-            total_games = sum(row[1:])
-            return {
-                'total_games': total_games
-            }
+        return {
+            'total_games': walk[-1].total
+        }
 
 def main():
-    # Initialize the database connection
-    db = ChessDatabase('chess_game_data.db')
+    # Read the database in process, or through the explorer service if $CHESS_EXPLORER is set
+    explorer = open_explorer('chess_game_data.db')
 
     # List of move sequences to search for
     move_sequences = [
@@ -80,9 +67,10 @@ def main():
 
     # Iterate over the move sequences and retrieve statistics
     for move_sequence in move_sequences:
-        stats = db.get_statistics(move_sequence)
-        if stats and stats['total_games']>0:  # Check for total_games > 5 digits
-            print(f"Sequence: {' '.join(move_sequence)}, Total Games: {stats['total_games']}")
+        stats = explorer.stats(move_sequence)
+        if stats and stats.total>0:  # Check for total_games > 5 digits
+            print(f"Sequence: {' '.join(move_sequence)}, Total Games: {stats.total}")
+    explorer.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,198 @@
+# Opening sequences the Gemini move-quality experiments ask about.
+
+# Common and uncommon sequences
+common_sequences =[
+
+    ['e4','c5','Nf3'],
+    ['e4','c5','Nf3','d6'],
+    ['e4', 'e5', 'Nf3', 'Nc6'],  # Ruy-Lopez
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bc4'],  # Italian Game
+    ['e4', 'c5'],                       # Sicilian Defense
+    ['e4', 'e6'],                       # French Defense
+    ['e4'],                       # Caro-Kann Defense
+    ['e4', 'd6', 'd4'],          # Pirc Defense
+    ['d4', 'd5'],                 # Queen's Gambit
+    ['d4', 'Nf6', 'c4'],          # King's Indian Defense
+    ['d4', 'Nf6', 'c4', 'e6', 'Nc3'],  # Nimzo-Indian Defense
+    ['d4', 'Nf6', 'c4', 'g6', 'Nc3'],   # Grünfeld Defense
+    ['d4', 'd5'],                # London System
+    ['d4', 'd5', 'c4'],           # Slav Defense
+    ['c4'],                             # English Opening
+    ['e4', 'd5'],                       # Scandinavian Defense
+    ['e4', 'e5', 'Nc3'],                # Vienna Game
+    ['d4', 'f5'],                       # Dutch Defense
+    ['e4', 'Nf6'],                      # Alekhine's Defense
+    ['e4', 'g6'],                       # Modern Defense
+    ['d4', 'Nf6', 'c4', 'c5'],          # Benoni Defense
+    ['d4', 'd5', 'e3'],                 # Stonewall Attack
+    ['f4'],                             # Bird’s Opening
+    ['Nf3'],                            # Reti Opening
+    ['d4', 'Nf6', 'c4', 'e6', 'g3'],    # Catalan Opening
+    ['e4', 'e5', 'f4'],                 # King’s Gambit
+    ['e4', 'e5', 'Nf3', 'Nc6', 'd4'],   # Scotch Game
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Nc3'],  # Four Knights Game
+    ['e4', 'e5', 'Nf3', 'Nf6'],         # Petrov's Defense
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bc4'],  # Giuoco Piano
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bc4', 'Bc5'],  # Evans Gambit
+    ['d4', 'Nf6', 'Bg5'],               # Trompowsky Attack
+    ['e4', 'e5', 'Qh5', 'Nc6', 'Bc4', 'Nf6'],  # Scholar’s Mate
+    ['f3', 'e5', 'g4'],         # Fool’s Mate
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'Nf6'],  # Back-Rank Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5'],  # Knight Fork Idea
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5'],  # Pin Example
+    ['e4', 'e5', 'Nf3', 'Nc6', 'd4'],  # Discovered Attack Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'd4'],  # Smothered Mate Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'Nf6', 'O-O'],  # Double Check Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'd6'],  # Windmill Setup
+    ['e4', 'e5', 'Qh5', 'Nc6', 'Bc4', 'g6'],  # Perpetual Check Setup
+    ['e4', 'e5', 'd4', 'exd4'],  # En passant Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5'],  # Promotion Tactic Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'd4'],  # Overloading Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5'],  # Zugzwang Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5'],  # Interference Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5'],  # Undermining Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'd4', 'exd4'],  # Trapped Piece Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4'],  # Zwischenzug Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'Nf6', 'O-O'] # Decoy Setup
+]
+
+uncommon_sequences = [
+    ['b4'],                             # Orangutan Opening
+    ['g4'],                             # Grob Attack
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Be2'],  # Hungarian Defense
+    ['e4', 'e5', 'Nf3', 'd5'],          # Elephant Gambit
+    ['d4', 'd5', 'c4', 'e5'],           # Albin Countergambit
+    ['e4', 'e5', 'Nf3', 'f5'],          # Latvian Gambit
+    ['e4', 'c5', 'd4'],                 # Smith-Morra Gambit
+    ['d4', 'd5', 'e4'],                 # Blackmar-Diemer Gambit
+    ['d4', 'e5'],                       # Englund Gambit
+    ['e4', 'b6'],                       # Owen's Defense
+    ['e4', 'Nc6'],                      # Bird's Defense
+    ['a4'],                             # Ware Opening
+    ['e4', 'e5', 'Ke2'],                # Bongcloud Attack
+    ['e4', 'a6'],                       # St. George Defense
+    ['b4'],                             # Polish Opening
+    ['h4'],                             # Kadas Opening
+    ['e4', 'e5', 'Nf3', 'f6'],          # Damiano Defense
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Nxe5'], # Irish Gambit
+    ['e4', 'b6', 'd4', 'g6', 'Nf3', 'Bg7'],  # Hippopotamus Defense
+    ['e4', 'e6', 'd4', 'd5', 'Nd2', 'h6'],  # Czech Defense
+    ['g3'],                             # King's Fianchetto
+    ['e4', 'Nc6'],                      # Nimzowitsch Defense
+    ['e4', 'g6', 'Bc4', 'Bg7', 'Qf3'],  # Monkey's Bum
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bc4', 'Bc5', 'Bxf7+'],  # Jerome Gambit
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Nc3', 'Nf6', 'Nxe5'],   # Halloween Gambit
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'd6'],  # Bishop and Knight Mate Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'Nf6', 'O-O', 'Nxe4'],  # King March Setup
+    ['e4', 'e5', 'd4', 'exd4', 'c3', 'dxc3', 'bxc3', 'd5'],  # Underpromotion Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'd6', 'd4', 'exd4'],  # Stalemate Sacrifice Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'd4', 'exd4', 'c3'],         # Fortress Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'd6', 'd4'],          # Trojan Horse Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'Nf6'],  # King Hunt Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'b5'],   # Staircase Mate Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'Nf6', 'O-O', 'a6'],  # Corridor Mate Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'd5'],   # Damiano Mate Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'b5'],   # Epaulette Mate Setup
+    ['e4', 'e5', 'd4', 'exd4', 'c3'],                      # Battering Ram Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'b5'],   # Arabian Mate Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'd4', 'exd4'],              # Swindle Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'b5'],   # Domino Effect Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'd6'],               # Triangulation Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'd6', 'd4'],         # Philidor’s Legacy Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6'],               # Lolli’s Mate Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4'],        # Anastasia’s Mate Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'Nf6'],              # Boden’s Mate Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4'],        # Cross-Check Setup
+    ['g3', 'd5', 'Bg2', 'c6'],                             # Hypermodern Opening
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'd4'],         # Intermezzo Sacrifice Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'd4', 'exd4', 'c3'],        # Double Bishop Mate Setup
+    ['e4', 'c5', 'f4']                                # Pawn Storm Setup
+]
+
+# The sets of scorediff_t-test, chosen by their count in the database: min 5 digits or more for common
+common_sequences_by_count =[
+
+    ['e4','c5','Nf3'],
+    ['e4','c5','Nf3','d6'],
+    ['e4', 'e5', 'Nf3', 'Nc6'],  # Ruy-Lopez
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bc4'],  # Italian Game
+    ['e4', 'c5'],                       # Sicilian Defense
+    ['e4', 'e6'],                       # French Defense
+    ['e4'],                       # Caro-Kann Defense
+    ['e4', 'd6', 'd4'],          # Pirc Defense
+    ['d4', 'd5'],                 # Queen's Gambit
+    ['d4', 'Nf6', 'c4'],          # King's Indian Defense
+    ['d4', 'Nf6', 'c4', 'e6', 'Nc3'],  # Nimzo-Indian Defense
+    ['d4', 'Nf6', 'c4', 'g6', 'Nc3'],   # Grünfeld Defense
+    ['d4', 'd5'],                # London System
+    ['d4', 'd5', 'c4'],           # Slav Defense
+    ['c4'],                             # English Opening
+    ['e4', 'd5'],                       # Scandinavian Defense
+    ['e4', 'e5', 'Nc3'],                # Vienna Game
+    ['d4', 'f5'],                       # Dutch Defense
+    ['e4', 'Nf6'],                      # Alekhine's Defense
+    ['e4', 'g6'],                       # Modern Defense
+    ['d4', 'Nf6', 'c4', 'c5'],          # Benoni Defense
+    ['d4', 'd5', 'e3'],                 # Stonewall Attack
+    ['f4'],                             # Bird’s Opening
+    ['Nf3'],                            # Reti Opening
+    ['d4', 'Nf6', 'c4', 'e6', 'g3'],    # Catalan Opening
+    ['e4', 'e5', 'f4'],                 # King’s Gambit
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Nc3'],  # Four Knights Game
+    ['e4', 'e5', 'Nf3', 'Nf6'],         # Petrov's Defense
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bc4'],  # Giuoco Piano
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bc4', 'Bc5'],  # Evans Gambit
+    ['d4', 'Nf6', 'Bg5'],               # Trompowsky Attack
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'Nf6'],  # Back-Rank Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5'],  # Knight Fork Idea
+    ['e4', 'e5', 'Nf3', 'Nc6', 'd4'],  # Smothered Mate Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'Nf6', 'O-O'],  # Double Check Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'd6'],  # Windmill Setup
+    ['e4', 'e5', 'd4', 'exd4'],  # En passant Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'd4'],  # Overloading Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'd4', 'exd4'],  # Trapped Piece Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4'],  # Zwischenzug Setup
+]
+
+uncommon_sequences_by_count = [ # max count in db is upto 4 digits so <=4
+   ['g4'],         #Grob Opening                    
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Be2'],  
+    ['e4', 'e5', 'Nf3', 'd5'],          
+    ['e4', 'e5', 'Nf3', 'f5'],          
+    ['d4', 'd5', 'e4'],              
+    ['d4', 'e5'],                    
+    ['a4'],                           
+    ['e4', 'e5', 'Ke2'],                # Bongcloud Attack
+    ['e4', 'a6'],                       # St. George Defense
+    ['h4'],                             # Kadas Opening
+    ['e4', 'e5', 'Nf3', 'f6'],          # Damiano Defense
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Nxe5'], # Irish Gambit
+    ['e4', 'b6', 'd4', 'g6', 'Nf3', 'Bg7'],  # Hippopotamus Defense
+    ['e4', 'e6', 'd4', 'd5', 'Nd2', 'h6'],  # Czech Defense
+    ['e4', 'g6', 'Bc4', 'Bg7', 'Qf3'],  # Monkey's Bum
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bc4', 'Bc5', 'Bxf7+'],  # Jerome Gambit
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Nc3', 'Nf6', 'Nxe5'],   # Halloween Gambit
+    ['e4', 'e5', 'd4', 'exd4', 'c3', 'dxc3', 'bxc3', 'd5'],  # Underpromotion Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'd6', 'd4', 'exd4'],  # Stalemate Sacrifice Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'd4', 'exd4', 'c3'],         # Fortress Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'd6', 'd4'],          # Trojan Horse Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'b5'],   # Staircase Mate Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'Nf6', 'O-O', 'a6'],  # Corridor Mate Setup
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'd5'],   # Damiano Mate Setup
+    ['e4', 'e5', 'd4', 'exd4', 'c3'],                      # Battering Ram Setup
+    ['g3', 'd5', 'Bg2', 'c6'],                             # Hypermodern Opening
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'd4'],         # Intermezzo Sacrifice Setup
+    ['e4', 'f6'],                     # Barnes Opening
+    ['Nh3'],                          # Amar Opening
+    ['a3'],                           # Anderssen Opening
+    ['Na3'],                          # Durkin Opening
+    ['h3'],                           # Clemenz Opening
+    ['a4', 'e5'],                     # Desprez Opening
+    ['e4', 'e5', 'Qh5'],              # King's Head Opening
+    ['e4', 'f5'],                     # Fried Fox Defense
+    ['e4', 'd5', 'Nf3'],              # Tennison Gambit
+    ['f3', 'e5', 'g4', 'Qh4#'],       # Hammerschlag Opening (Fool's Mate)
+    ['h3', 'a5'],                     # Creepy Crawly Opening
+    ['g4', 'h5'],                     # Toilet Variation
+    ['b4', 'd5']
+]
@@ -0,0 +1,367 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+from typing import List, Optional, Tuple
+from opening_tree import NodeStats, OpeningTree
+
+# The one setting that moves a client from the in-process API to the service:
+# unset, open_explorer() reads the database itself; set to an address such
+# as "unix:/tmp/chess_explorer.sock" or "tcp:127.0.0.1:8765", it asks the
+# service listening there
+ADDRESS_ENV = 'CHESS_EXPLORER'
+DEFAULT_ADDRESS = 'tcp:127.0.0.1:8765'
+
+DEFAULT_BATCH_WINDOW = 0.002  # Seconds a batch waits for more requests
+DEFAULT_MAX_BATCH = 256
+MAX_IN_FLIGHT = 1024  # Requests of one client being answered before the service stops reading its socket
+LATENCY_SAMPLES = 10000  # Most recent requests the percentiles are taken over
+
+# Wire protocol: one JSON object per line both ways. Requests are
+# {"id": ..., "op": "stats" | "children" | "walk" | "metrics", ...};
+# the response carries the same id and either "result" or "error".
+# Responses on one connection may come back out of order.
+
+
+class LocalExplorer:
+    """The explorer API answered in process from an OpeningTree."""
+
+    def __init__(self, db_path: str = 'chess_game_data.db', **tree_options):
+        self.tree = OpeningTree(db_path, **tree_options)
+
+    def stats(self, path: List[str]) -> Optional[NodeStats]:
+        """Counts of the position after path, or None if it isn't in the database."""
+        walk = self.tree.walk_prefixes([path])[0]
+        return walk[-1] if path and len(walk) == len(path) else None
+
+    def children(self, path: List[str], k: Optional[int] = None) -> List[Tuple[str, NodeStats]]:
+        """The k most played moves after path, most played first."""
+        with self.tree.snapshot() as conn:
+            walk = self.tree.walk_prefixes([path])[0]
+            if len(walk) < len(path):
+                return []
+            return self.tree.get_children(conn, walk[-1].id if walk else None, k)
+
+    def walk(self, paths: List[List[str]]) -> List[List[NodeStats]]:
+        """OpeningTree.walk_prefixes."""
+        return self.tree.walk_prefixes(paths)
+
+    def close(self):
+        self.tree.close()
+
+
+class ExplorerClient:
+    """
+    The explorer API answered by an ExplorerService. Same methods and
+    results as LocalExplorer; calls from several threads are serialized.
+    """
+
+    def __init__(self, address: str):
+        self.sock = connect(address)
+        self.reader = self.sock.makefile('r', encoding='utf-8')
+        self.lock = threading.Lock()
+        self.next_id = 0
+
+    def _call(self, op: str, **params):
+        with self.lock:
+            self.next_id += 1
+            request = dict(params, id=self.next_id, op=op)
+            self.sock.sendall((json.dumps(request) + "\n").encode('utf-8'))
+            line = self.reader.readline()
+        if not line:
+            raise ConnectionError("explorer service closed the connection")
+        response = json.loads(line)
+        if 'error' in response:
+            raise RuntimeError(f"explorer service: {response['error']}")
+        return response['result']
+
+    def stats(self, path: List[str]) -> Optional[NodeStats]:
+        result = self._call('stats', path=path)
+        return NodeStats(*result) if result is not None else None
+
+    def children(self, path: List[str], k: Optional[int] = None) -> List[Tuple[str, NodeStats]]:
+        return [(move, NodeStats(*stats)) for move, stats in self._call('children', path=path, k=k)]
+
+    def walk(self, paths: List[List[str]]) -> List[List[NodeStats]]:
+        return [[NodeStats(*stats) for stats in walk] for walk in self._call('walk', paths=paths)]
+
+    def metrics(self) -> dict:
+        return self._call('metrics')
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+
+def open_explorer(db_path: str = 'chess_game_data.db', address: Optional[str] = None):
+    """
+    An ExplorerClient if an address is given or set in $CHESS_EXPLORER,
+    otherwise a LocalExplorer over db_path.
+    """
+    address = address or os.environ.get(ADDRESS_ENV)
+    if address:
+        return ExplorerClient(address)
+    return LocalExplorer(db_path)
+
+
+def parse_address(address: str) -> Tuple[str, tuple]:
+    kind, _, rest = address.partition(':')
+    if kind == 'unix':
+        return kind, (rest,)
+    if kind == 'tcp':
+        host, _, port = rest.rpartition(':')
+        return kind, (host or '127.0.0.1', int(port))
+    raise ValueError(f"Unknown explorer address {address!r}: use unix:PATH or tcp:HOST:PORT")
+
+
+def connect(address: str) -> socket.socket:
+    kind, target = parse_address(address)
+    if kind == 'unix':
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(target[0])
+    else:
+        sock = socket.create_connection(target)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+def _is_path(path) -> bool:
+    """A list of SAN moves, as the stats, children and walk requests take."""
+    return isinstance(path, list) and all(isinstance(move, str) for move in path)
+
+
+class LatencyRecorder:
+    """Request latencies (in seconds) of the most recent requests, and their percentiles."""
+
+    def __init__(self, samples: int = LATENCY_SAMPLES):
+        self.latencies = deque(maxlen=samples)
+        self.requests = 0
+
+    def record(self, latency: float):
+        self.latencies.append(latency)
+        self.requests += 1
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def stats(self) -> dict:
+        return {
+            'requests': self.requests,
+            'p50_ms': self.percentile(50) * 1000,
+            'p99_ms': self.percentile(99) * 1000
+        }
+
+
+class ExplorerService:
+    """
+    Asyncio server of the explorer API over one OpeningTree, so every
+    client shares its connections and node cache.
+
+    Requests arriving within batch_window of each other (up to max_batch)
+    are answered together: the paths of all their stats, children and walk
+    requests go through a single walk_prefixes, run in a worker thread so
+    the event loop keeps accepting requests meanwhile. A batch is answered
+    from one snapshot, so it never mixes two states of a database being
+    loaded into.
+    """
+
+    def __init__(self, db_path: str, batch_window: float = DEFAULT_BATCH_WINDOW,
+                 max_batch: int = DEFAULT_MAX_BATCH, **tree_options):
+        self.tree = OpeningTree(db_path, **tree_options)
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.latency = LatencyRecorder()
+        self.batches = 0
+        self.batched_requests = 0
+        self.pending: Optional[asyncio.Queue] = None
+
+    async def serve(self, address: str, report_interval: Optional[float] = None):
+        self.pending = asyncio.Queue()
+        batcher = asyncio.create_task(self._batch_loop())
+        reporter = asyncio.create_task(self._report_loop(report_interval)) if report_interval else None
+        kind, target = parse_address(address)
+        if kind == 'unix':
+            if os.path.exists(target[0]):
+                os.unlink(target[0])  # Left over by a previous run
+            server = await asyncio.start_unix_server(self._serve_client, target[0])
+        else:
+            server = await asyncio.start_server(self._serve_client, *target)
+        print(f"Explorer serving {self.tree.db_path} on {address}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            if reporter:
+                reporter.cancel()
+            self.tree.close()
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        tasks = set()
+        # A client that sends faster than it reads fills up its in-flight slots, each
+        # waiting in drain(); the service then stops reading from it until it catches up
+        in_flight = asyncio.Semaphore(MAX_IN_FLIGHT)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                await in_flight.acquire()
+                task = asyncio.create_task(self._answer(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                task.add_done_callback(lambda _: in_flight.release())
+            if tasks:
+                await asyncio.wait(tasks)
+        finally:
+            writer.close()
+
+    async def _answer(self, line: bytes, writer: asyncio.StreamWriter):
+        start = time.perf_counter()
+        response = {}
+        try:
+            request = json.loads(line)
+            response['id'] = request.get('id')
+            if request.get('op') == 'metrics':
+                response['result'] = self.metrics()
+            else:
+                future = asyncio.get_running_loop().create_future()
+                await self.pending.put((request, future))
+                response['result'] = await future
+        except Exception as e:
+            response['error'] = f"{type(e).__name__}: {e}"
+        writer.write((json.dumps(response) + "\n").encode('utf-8'))
+        self.latency.record(time.perf_counter() - start)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass  # The client went away; _serve_client closes the writer
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.pending.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.pending.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self.batches += 1
+            self.batched_requests += len(batch)
+            try:
+                results = await loop.run_in_executor(None, self._run_batch, [request for request, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    @staticmethod
+    def _request_error(request: dict) -> Optional[Exception]:
+        """Why a request can't be answered, or None if it is well formed."""
+        op = request.get('op')
+        if op in ('stats', 'children'):
+            if not _is_path(request.get('path')):
+                return ValueError(f"{op} needs 'path', a list of SAN moves")
+            k = request.get('k')
+            if op == 'children' and k is not None and (type(k) is not int or k < 0):
+                return ValueError("k must be a non-negative integer")
+        elif op == 'walk':
+            paths = request.get('paths')
+            if not isinstance(paths, list) or not all(_is_path(path) for path in paths):
+                return ValueError("walk needs 'paths', a list of lists of SAN moves")
+        else:
+            return ValueError(f"unknown op {op!r}")
+        return None
+
+    def _run_batch(self, requests: List[dict]) -> list:
+        """
+        Answer a batch of requests with one walk over all of their paths. A
+        malformed request is answered with its own error, leaving the rest
+        of the batch untouched.
+        """
+        errors = [self._request_error(request) for request in requests]
+        paths = []
+        for request, error in zip(requests, errors):
+            if error is not None:
+                continue
+            if request['op'] in ('stats', 'children'):
+                paths.append(request['path'])
+            else:
+                paths.extend(request['paths'])
+        results = []
+        with self.tree.snapshot() as conn:
+            walks = iter(self.tree.walk_prefixes(paths))
+            for request, error in zip(requests, errors):
+                if error is not None:
+                    results.append(error)
+                    continue
+                op = request['op']
+                if op == 'stats':
+                    path, walk = request['path'], next(walks)
+                    results.append(walk[-1] if path and len(walk) == len(path) else None)
+                elif op == 'children':
+                    path, walk = request['path'], next(walks)
+                    if len(walk) < len(path):
+                        results.append([])
+                    else:
+                        results.append(self.tree.get_children(conn, walk[-1].id if walk else None,
+                                                              request.get('k')))
+                else:
+                    results.append([next(walks) for _ in request['paths']])
+        return results
+
+    def metrics(self) -> dict:
+        return {
+            'latency': self.latency.stats(),
+            'batches': self.batches,
+            'mean_batch_size': self.batched_requests / self.batches if self.batches else 0.0,
+            'node_cache': self.tree.cache.stats()
+        }
+
+    async def _report_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            print(f"Explorer metrics: {self.metrics()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the opening tree to several local clients at once.")
+    parser.add_argument('--db', default='chess_game_data.db')
+    parser.add_argument('--listen', default=os.environ.get(ADDRESS_ENV, DEFAULT_ADDRESS),
+                        help="unix:PATH or tcp:HOST:PORT (default: $CHESS_EXPLORER or %(default)s)")
+    parser.add_argument('--batch-window-ms', type=float, default=DEFAULT_BATCH_WINDOW * 1000)
+    parser.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH)
+    parser.add_argument('--cache-size', type=int, help="nodes kept in the shared node cache")
+    parser.add_argument('--report-interval', type=float, default=60.0,
+                        help="seconds between metrics reports, 0 to disable")
+    args = parser.parse_args()
+
+    service = ExplorerService(args.db, args.batch_window_ms / 1000, args.max_batch, cache_size=args.cache_size)
+    try:
+        asyncio.run(service.serve(args.listen, args.report_interval or None))
+    except KeyboardInterrupt:
+        print(f"\nExplorer metrics: {service.metrics()}")
+
+
+if __name__ == "__main__":
+    main()
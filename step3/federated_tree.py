@@ -0,0 +1,175 @@
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+from opening_tree import NodeStats, OpeningTree
+
+
+class PrefixTrie:
+    """The move sequences of a query merged into a prefix tree; node 0 is the root and parents come before children."""
+
+    def __init__(self, sequences: Sequence[List[str]]):
+        self.children: List[Dict[str, int]] = [{}]
+        for sequence in sequences:
+            node = 0
+            for move in sequence:
+                child = self.children[node].get(move)
+                if child is None:
+                    child = self.children[node][move] = len(self.children)
+                    self.children.append({})
+                node = child
+
+
+class FederatedTree:
+    """
+    Read access to an opening tree split over several shard databases, such
+    as one per source dump or one per first move. Same read API as
+    OpeningTree, with the counts of a path summed over all shards that have it.
+
+    Each query is sent to every shard that has the path's first move, in
+    parallel threads, so shards on different disks are read concurrently
+    (sqlite3 releases the GIL while it reads). Node ids are shard-local, so
+    the merged NodeStats have id None; their sibling_rank is recomputed
+    from the merged sibling totals. As in a single tree, where ties go to
+    the older node (the lower Moves.id), ties go to the move of the first
+    shard that has it, then to the older node within that shard: the
+    ranks of a tree loaded from the shards' sources in shard order.
+
+    Like OpeningTree, every read runs in a snapshot(), here one per shard.
+    With no node ids, children are looked up by path rather than by parent
+    id: get_children_by_path(move_sequence, k) takes the place of
+    OpeningTree.get_children(conn, parent_id, k).
+    """
+
+    def __init__(self, shard_paths: Sequence[str], pool_size: int = 2, cache_size: Optional[int] = None,
+                 **connect_options):
+        if not shard_paths:
+            raise ValueError("FederatedTree needs at least one shard database")
+        self.shards = [OpeningTree(path, pool_size, cache_size, **connect_options) for path in shard_paths]
+        self.executor = ThreadPoolExecutor(max_workers=len(self.shards))
+        self._pinned = threading.local()  # Shard connections of this thread's open snapshot
+        # First moves of each shard (as of opening), to route paths to the shards that can have them
+        self.first_moves: List[Set[str]] = list(self.executor.map(self._first_moves, self.shards))
+
+    def close(self):
+        self.executor.shutdown()
+        for shard in self.shards:
+            shard.close()
+
+    @contextmanager
+    def snapshot(self) -> Iterator[List[sqlite3.Connection]]:
+        """
+        Pin a snapshot of every shard for the calling thread and yield their
+        connections. The shards are pinned one after the other, so a shard
+        being written to may move on between two of them.
+        """
+        if getattr(self._pinned, 'conns', None) is not None:
+            yield self._pinned.conns
+            return
+        with ExitStack() as stack:
+            self._pinned.conns = [stack.enter_context(shard.snapshot()) for shard in self.shards]
+            try:
+                yield self._pinned.conns
+            finally:
+                self._pinned.conns = None
+
+    @staticmethod
+    def _first_moves(shard: OpeningTree) -> Set[str]:
+        with shard.snapshot() as conn:
+            return {move for move, _ in shard.get_children(conn, None)}
+
+    @staticmethod
+    def _shard_children(shard: OpeningTree, conn: sqlite3.Connection, trie: PrefixTrie,
+                        wanted: Set[int]) -> Dict[int, Dict[str, NodeStats]]:
+        """All children of each wanted trie node the shard has, as {trie node: {move: NodeStats}}."""
+        found = {}
+        shard_ids = {0: None}  # Trie node -> Moves.id in this shard
+        for node in sorted(wanted):
+            if node not in shard_ids:
+                continue  # The shard doesn't have this prefix
+            children = dict(shard.get_children(conn, shard_ids[node]))
+            found[node] = children
+            for move, child in trie.children[node].items():
+                if move in children:
+                    shard_ids[child] = children[move].id
+        return found
+
+    def _merged_children(self, trie: PrefixTrie, wanted: Set[int]) -> Dict[int, Dict[str, NodeStats]]:
+        """Children of the wanted trie nodes with counts summed over the shards and merged sibling ranks."""
+        first_moves = set(trie.children[0])
+        shards = [index for index, moves in enumerate(self.first_moves) if moves & first_moves or not first_moves]
+        merged: Dict[int, Dict[str, list]] = {}
+        age: Dict[int, Dict[str, Tuple[int, int]]] = {}  # (shard, Moves.id) where each move first appears
+        with self.snapshot() as conns:
+            # Each shard's connection is used by one thread at a time
+            found_by_shard = list(self.executor.map(
+                lambda index: self._shard_children(self.shards[index], conns[index], trie, wanted), shards))
+        for shard, found in zip(shards, found_by_shard):
+            for node, children in found.items():
+                siblings = merged.setdefault(node, {})
+                for move, stats in children.items():
+                    age.setdefault(node, {}).setdefault(move, (shard, stats.id))
+                    counts = siblings.setdefault(move, [0, 0, 0, 0])
+                    counts[0] += stats.white_win_count
+                    counts[1] += stats.black_win_count
+                    counts[2] += stats.draw_count
+                    counts[3] += stats.unfinished_count
+
+        ranked = {}
+        for node, siblings in merged.items():
+            order = sorted(siblings, key=lambda move: (-sum(siblings[move]), age[node][move]))
+            ranked[node] = {move: NodeStats(None, *siblings[move], rank) for rank, move in enumerate(order, start=1)}
+        return ranked
+
+    def walk_prefixes(self, sequences: Sequence[List[str]]) -> List[List[NodeStats]]:
+        """Same result as OpeningTree.walk_prefixes, over all shards."""
+        trie = PrefixTrie(sequences)
+        wanted = {node for node, children in enumerate(trie.children) if children}
+        merged = self._merged_children(trie, wanted)
+
+        walks = []
+        for sequence in sequences:
+            walk = []
+            node = 0
+            for move in sequence:
+                stats = merged.get(node, {}).get(move)
+                if stats is None:
+                    break
+                walk.append(stats)
+                node = trie.children[node][move]
+            walks.append(walk)
+        return walks
+
+    def get_children_by_path(self, move_sequence: List[str], k: Optional[int] = None) -> List[Tuple[str, NodeStats]]:
+        """
+        The k most played moves after move_sequence over all shards, most
+        played first, as (SAN, NodeStats); all of them when k is None. The
+        counterpart of OpeningTree.get_children, which takes a parent id.
+        """
+        trie = PrefixTrie([move_sequence])
+        path = [0]
+        for move in move_sequence:
+            path.append(trie.children[path[-1]][move])
+        children = self._merged_children(trie, set(path)).get(path[-1], {})
+        return sorted(children.items(), key=lambda item: item[1].sibling_rank)[:k]
+
+    def get_total_games_in_db(self) -> int:
+        """Get the total number of games over all shards."""
+        with self.snapshot() as conns:
+            return sum(self.executor.map(OpeningTree.get_total_games_in_db, self.shards, conns))
+
+    def get_statistics(self, move_sequence: List[str]) -> Optional[dict]:
+        """Get cumulative statistics for a move sequence, summed over the shards."""
+        walk = self.walk_prefixes([move_sequence])[0]
+        if not walk or len(walk) < len(move_sequence):
+            return None
+
+        stats = walk[-1]
+        return {
+            'white_win_rate': stats.white_win_count,
+            'black_win_rate': stats.black_win_count,
+            'draw_rate': stats.draw_count,
+            'unfinished_rate': stats.unfinished_count,
+            'total_games': stats.total
+        }
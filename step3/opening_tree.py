@@ -0,0 +1,342 @@
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Hashable, Iterator, List, Optional, Sequence, Tuple
+
+# Read-side tuning. The tree is read far more often than it is written, so
+# map up to 1 GiB of it into memory (pages then live in the OS page cache,
+# shared by every connection and process) and give each connection a
+# 64 MiB private page cache on top
+DEFAULT_MMAP_SIZE = 1 << 30
+DEFAULT_CACHE_KIB = 64 * 1024
+DEFAULT_CACHED_STATEMENTS = 256
+DEFAULT_NODE_CACHE_SIZE = 200000  # Nodes; roughly 200 bytes each
+
+
+class NodeStats(namedtuple('NodeStats', ['id', 'white_win_count', 'black_win_count',
+                                         'draw_count', 'unfinished_count', 'sibling_rank'])):
+    """Counts of one Moves node; id is the node's Moves.id, sibling_rank its popularity among its siblings."""
+    __slots__ = ()
+
+    @property
+    def total(self) -> int:
+        return self.white_win_count + self.black_win_count + self.draw_count + self.unfinished_count
+
+
+def connect_read_only(db_path: str, immutable: bool = False, mmap_size: int = DEFAULT_MMAP_SIZE,
+                      cache_kib: int = DEFAULT_CACHE_KIB,
+                      cached_statements: int = DEFAULT_CACHED_STATEMENTS) -> sqlite3.Connection:
+    """
+    Open a read-only connection (mode=ro, so a wrong path fails instead of
+    creating an empty database). immutable=True also skips all locking and
+    change detection; only use it when nothing writes to the file meanwhile.
+    Prepared statements are cached per connection, keyed by their SQL text.
+    """
+    uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+    if immutable:
+        uri += "&immutable=1"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=cached_statements)
+    conn.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+    conn.execute(f"PRAGMA cache_size = {-int(cache_kib)}")  # Negative: size in KiB
+    return conn
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of long-lived read-only connections to one database.
+    Connections are opened on demand, up to `size`; when all are in use,
+    connection() waits for one to be given back.
+    """
+
+    def __init__(self, db_path: str, size: int = 4, **connect_options):
+        self.db_path = db_path
+        self.size = size
+        self.connect_options = connect_options  # Passed on to connect_read_only
+        self._idle: queue.LifoQueue = queue.LifoQueue()  # Most recently used first: its cache is warm
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._closed = False
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if self._closed:
+                conn.close()
+            else:
+                self._idle.put(conn)
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                conn = connect_read_only(self.db_path, **self.connect_options)
+                self._opened += 1
+                return conn
+        return self._idle.get()
+
+    def close(self):
+        """Close the idle connections; connections still in use are closed as they come back."""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class NodeCache:
+    """
+    Thread-safe LRU cache of (parent_id, SAN move) -> NodeStats, i.e. of the
+    single-ply lookups every reader does to descend the tree. The step3
+    inputs share long opening prefixes, so most lookups of a run (and all of
+    a repeated run in the same process) are answered from memory.
+
+    OpeningTree keys the entries by the database's TreeVersion as well, so a
+    reader never gets a node cached from another state of the tree, and
+    moves the cache to each newer version it sees (dropping the old entries).
+    Databases from before TreeVersion have version None; clear() the cache
+    after loading more games into those.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_NODE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.version = None  # TreeVersion of the newest entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[NodeStats]:
+        with self._lock:
+            node = self._entries.get(key)
+            if node is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return node
+
+    def put(self, key: Hashable, node: NodeStats):
+        with self._lock:
+            self._entries[key] = node
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def set_version(self, version: Optional[int]):
+        """Drop every entry if the tree has moved on to a newer version."""
+        with self._lock:
+            if version is not None and (self.version is None or version > self.version):
+                self._entries.clear()
+                self.version = version
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+# One cache per database file, shared by every OpeningTree in the process
+_node_caches: Dict[str, NodeCache] = {}
+_node_caches_lock = threading.Lock()
+
+
+def get_node_cache(db_path: str, max_size: Optional[int] = None) -> NodeCache:
+    """The process-wide NodeCache of a database, created on first use; max_size resizes it."""
+    key = str(Path(db_path).resolve())
+    with _node_caches_lock:
+        cache = _node_caches.get(key)
+        if cache is None:
+            cache = _node_caches[key] = NodeCache(max_size or DEFAULT_NODE_CACHE_SIZE)
+        elif max_size is not None:
+            cache.max_size = max_size  # Shrinking takes effect on the next put
+        return cache
+
+
+class OpeningTree:
+    """
+    Read access to the Moves tree shared by the step3 scripts.
+    The scripts live one folder down and put step3/ on sys.path to import it.
+
+    All queries go through a pool of read-only connections that stay open
+    for the life of the object, so the page cache, the parsed schema and the
+    prepared statements are reused from one call to the next. Resolved nodes
+    are kept in the database's process-wide NodeCache (cache_size entries).
+
+    Every read method runs in a snapshot(): one read transaction, which in
+    WAL mode sees the database as of its start however much ingest commits
+    meanwhile. Wrap a whole analysis in `with tree.snapshot():` to give all
+    of its calls (in that thread) the same consistent view.
+    """
+
+    def __init__(self, db_path: str, pool_size: int = 4, cache_size: Optional[int] = None, **connect_options):
+        self.db_path = db_path
+        self.pool = ConnectionPool(db_path, pool_size, **connect_options)
+        self.cache = get_node_cache(db_path, cache_size)
+        self._pinned = threading.local()  # conn and version of this thread's open snapshot
+
+    def close(self):
+        self.pool.close()
+
+    @contextmanager
+    def snapshot(self) -> Iterator[sqlite3.Connection]:
+        """
+        Pin one consistent view of the database for the calling thread and
+        yield its connection. Nested snapshots reuse the outer one. The
+        write-ahead log can't be checkpointed past a pinned snapshot, so
+        don't keep one open much longer than the analysis that needs it.
+        """
+        if getattr(self._pinned, 'conn', None) is not None:
+            yield self._pinned.conn
+            return
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                # The first read starts the read transaction, i.e. takes the snapshot
+                version = self._read_version(conn)
+                self.cache.set_version(version)
+                self._pinned.conn, self._pinned.version = conn, version
+                yield conn
+            finally:
+                self._pinned.conn = self._pinned.version = None
+                conn.rollback()
+
+    @staticmethod
+    def _read_version(conn: sqlite3.Connection) -> Optional[int]:
+        try:
+            row = conn.execute("SELECT version FROM TreeVersion").fetchone()
+        except sqlite3.OperationalError:  # Schema from before v7
+            conn.execute("SELECT 1 FROM Moves LIMIT 1").fetchone()
+            return None
+        return row[0] if row else None
+
+    def pinned_version(self) -> Optional[int]:
+        """TreeVersion of the calling thread's snapshot, or of the newest cached nodes outside one."""
+        if getattr(self._pinned, 'conn', None) is not None:
+            return self._pinned.version
+        return self.cache.version
+
+    def walk_prefixes(self, sequences: Sequence[List[str]]) -> List[List[NodeStats]]:
+        """
+        Resolve every prefix of every move sequence in one pass.
+
+        Returns, for each sequence, the NodeStats of each of its plies,
+        stopping at the first move that isn't in the database (so the list
+        is shorter than the sequence). The sequences are merged into a
+        prefix tree first, so each distinct prefix in the whole input is
+        looked up once, and all uncached children of a prefix with one query.
+        """
+        # Prefix tree of the input: node = {move: child}
+        root: Dict[str, dict] = {}
+        for sequence in sequences:
+            node = root
+            for move in sequence:
+                node = node.setdefault(move, {})
+
+        stats = {}  # id(prefix tree node) -> NodeStats
+        with self.snapshot() as conn:
+            version = self.pinned_version()
+            codes = dict(conn.execute("SELECT san, code FROM MoveDict"))
+            stack = [(None, root)]
+            while stack:
+                parent_id, node = stack.pop()
+                children = {}
+                for move, child in node.items():
+                    cached = self.cache.get((version, parent_id, move))
+                    if cached is not None:
+                        stats[id(child)] = cached
+                        stack.append((cached.id, child))
+                    elif move in codes:
+                        children[codes[move]] = (move, child)
+                if not children:
+                    continue
+                placeholders = ", ".join("?" * len(children))
+                rows = conn.execute(f"""
+                    SELECT id, move, white_win_count, black_win_count, draw_count, unfinished_count,
+                           sibling_rank
+                    FROM Moves
+                    WHERE parent_id IS ? AND move IN ({placeholders})
+                """, (parent_id, *children)).fetchall()
+                for move_id, code, *counts in rows:
+                    move, child = children[code]
+                    stats[id(child)] = node_stats = NodeStats(move_id, *counts)
+                    self.cache.put((version, parent_id, move), node_stats)
+                    stack.append((move_id, child))
+
+        walks = []
+        for sequence in sequences:
+            walk = []
+            node = root
+            for move in sequence:
+                node = node[move]
+                node_stats = stats.get(id(node))
+                if node_stats is None:
+                    break
+                walk.append(node_stats)
+            walks.append(walk)
+        return walks
+
+    def get_child(self, conn: sqlite3.Connection, parent_id: Optional[int], move: str) -> Optional[NodeStats]:
+        """Look up one move below parent_id (None for first moves) on conn, through the cache."""
+        key = (self.pinned_version(), parent_id, move)
+        node = self.cache.get(key)
+        if node is None:
+            row = conn.execute("""
+                SELECT id, white_win_count, black_win_count, draw_count, unfinished_count, sibling_rank
+                FROM Moves
+                WHERE move = (SELECT code FROM MoveDict WHERE san = ?) AND parent_id IS ?
+            """, (move, parent_id)).fetchone()
+            if row is None:
+                return None
+            node = NodeStats(*row)
+            self.cache.put(key, node)
+        return node
+
+    def get_children(self, conn: sqlite3.Connection, parent_id: Optional[int],
+                     k: Optional[int] = None) -> List[Tuple[str, NodeStats]]:
+        """
+        The k most played moves below parent_id (None for first moves), most
+        played first, as (SAN, NodeStats); all of them when k is None. The
+        '<other>' bucket of a pruned tree has no sibling rank and is left out.
+        """
+        rows = conn.execute("""
+            SELECT d.san, m.id, m.white_win_count, m.black_win_count, m.draw_count, m.unfinished_count,
+                   m.sibling_rank
+            FROM Moves m JOIN MoveDict d ON d.code = m.move
+            WHERE m.parent_id IS ? AND m.sibling_rank IS NOT NULL
+            ORDER BY m.total DESC, m.id
+            LIMIT ?
+        """, (parent_id, -1 if k is None else k)).fetchall()
+        return [(san, NodeStats(*stats)) for san, *stats in rows]
+
+    def get_total_games_in_db(self, conn: Optional[sqlite3.Connection] = None) -> int:
+        """Get the total number of games in the entire database (on conn if given)."""
+        if conn is None:
+            with self.snapshot() as conn:
+                return self.get_total_games_in_db(conn)
+        row = conn.execute("SELECT SUM(total) FROM Moves WHERE parent_id IS NULL").fetchone()
+        return row[0] if row and row[0] else 0
@@ -0,0 +1,127 @@
+import multiprocessing
+import os
+import signal
+import time
+from typing import Callable, List, Optional
+from opening_tree import NodeStats, OpeningTree
+
+# A per-game analysis: (move_sequence, walk, total_games_in_db) -> the game's
+# output line, or None to write nothing for it. It must be a module-level
+# function (or a functools.partial of one) so it can be sent to the workers.
+GameFormatter = Callable[[List[str], List[NodeStats], int], Optional[str]]
+
+DEFAULT_CHUNK_SIZE = 64  # Games per task
+PROGRESS_INTERVAL = 5.0  # Seconds between progress lines
+
+# State of a worker process, set up once by _init_worker
+_tree: Optional[OpeningTree] = None
+_snapshot = None
+_format_game: Optional[GameFormatter] = None
+
+
+def _init_worker(db_path: str, format_game: GameFormatter, cache_size: Optional[int]):
+    global _tree, _snapshot, _format_game
+    _tree = OpeningTree(db_path, pool_size=1, cache_size=cache_size)
+    # Every chunk of the worker reads the same snapshot, pinned until the worker exits
+    _snapshot = _tree.snapshot()
+    _snapshot.__enter__()
+    _format_game = format_game
+
+
+def _init_pool_worker(db_path: str, format_game: GameFormatter, cache_size: Optional[int]):
+    # Ctrl-C is the parent's to handle: it terminates the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _init_worker(db_path, format_game, cache_size)
+
+
+def _close_worker():
+    global _tree, _snapshot
+    _snapshot.__exit__(None, None, None)
+    _tree.close()
+    _tree = _snapshot = None
+
+
+def _analyze_chunk(task):
+    """Lines of one chunk of games, the TreeVersion they were read at and the node cache hits and misses it took."""
+    move_sequences, total_games_in_db = task
+    hits, misses = _tree.cache.hits, _tree.cache.misses
+    walks = _tree.walk_prefixes(move_sequences)
+    lines = [_format_game(move_sequence, walk, total_games_in_db)
+             for move_sequence, walk in zip(move_sequences, walks)]
+    return lines, _tree.pinned_version(), _tree.cache.hits - hits, _tree.cache.misses - misses
+
+
+def run_games(input_file: str, output_file: str, format_game: GameFormatter, db_path: str,
+              workers: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+              cache_size: Optional[int] = None, append: bool = False) -> int:
+    """
+    Analyze every game line of input_file independently and write one output
+    line per game, in input order, so the output stays line-aligned with the
+    games. Games are spread in chunks over a pool of `workers` processes
+    (default: one per core), each with its own read-only OpeningTree;
+    workers=1 runs in this process. Progress is reported for all games
+    together. Returns the number of games analyzed.
+
+    Each worker reads from one snapshot for the whole run. If games are
+    being loaded meanwhile, workers that started after a commit see a newer
+    state than the others; that is reported at the end.
+    """
+    with open(input_file, 'r') as infile:
+        move_sequences = [line.strip().split() for line in infile]
+    workers = workers or os.cpu_count() or 1
+
+    tree = OpeningTree(db_path, pool_size=1, cache_size=cache_size)
+    with tree.snapshot():
+        total_games_in_db = tree.get_total_games_in_db()
+        version = tree.pinned_version()
+    tree.close()
+
+    tasks = [(move_sequences[start:start + chunk_size], total_games_in_db)
+             for start in range(0, len(move_sequences), chunk_size)]
+    if workers == 1:
+        _init_worker(db_path, format_game, cache_size)
+        pool = None
+        results = map(_analyze_chunk, tasks)
+    else:
+        pool = multiprocessing.Pool(workers, _init_pool_worker, (db_path, format_game, cache_size))
+        results = pool.imap(_analyze_chunk, tasks)  # imap keeps the input order
+
+    done = cache_hits = cache_misses = 0
+    versions = {version}
+    start = last_report = time.time()
+    try:
+        with open(output_file, 'a' if append else 'w') as outfile:
+            for lines, chunk_version, hits, misses in results:
+                versions.add(chunk_version)
+                outfile.writelines(line + "\n" for line in lines if line is not None)
+                done += len(lines)
+                cache_hits += hits
+                cache_misses += misses
+                if time.time() - last_report >= PROGRESS_INTERVAL:
+                    last_report = time.time()
+                    print(f"Processed {done}/{len(move_sequences)} games "
+                          f"({done / (last_report - start):.0f} games/s)")
+    except BaseException:
+        # The output file is closed, so the lines written so far are kept. The
+        # workers' tasks in flight would keep join() waiting: stop them instead
+        if pool is not None:
+            pool.terminate()
+        raise
+    else:
+        if pool is not None:
+            pool.close()
+    finally:
+        if pool is not None:
+            pool.join()
+        elif _tree is not None:
+            _close_worker()
+
+    elapsed = time.time() - start
+    lookups = cache_hits + cache_misses
+    print(f"Processed {done} games in {elapsed:.1f}s with {workers} worker(s) "
+          f"({done / elapsed if elapsed > 0 else 0:.0f} games/s); node cache hit rate "
+          f"{cache_hits / lookups if lookups else 0.0:.1%}")
+    if len(versions) > 1:
+        print(f"Warning: the database changed during the run; games were read at tree versions "
+              f"{sorted(versions)}")
+    return done
@@ -0,0 +1,133 @@
+import argparse
+import csv
+import os
+from collections import namedtuple
+from typing import List, Sequence, Union
+from federated_tree import FederatedTree
+from opening_tree import OpeningTree
+from tree_snapshot import SnapshotDatabase
+
+# One ply of one game. found is False for the first move that isn't in the
+# database, which ends the game's walk; its counts are then None, and
+# ply is the "moves to failure" point mean_failure looks at.
+PlyMetrics = namedtuple('PlyMetrics', [
+    'game', 'ply', 'move', 'found', 'total_games', 'white_win_count', 'black_win_count',
+    'draw_count', 'unfinished_count', 'black_win_rate', 'proportion', 'rank'
+])
+
+COLUMNS = PlyMetrics._fields
+
+
+def compute_progressions(tree: Union[OpeningTree, FederatedTree, SnapshotDatabase], move_sequences: Sequence[List[str]],
+                         top_k: int = 10) -> List[List[PlyMetrics]]:
+    """
+    Every per-ply metric of the step3 analyses in one pass: the prefixes of
+    all games are resolved by a single walk_prefixes, which also returns
+    each node's precomputed sibling rank.
+
+    For each game, one PlyMetrics per move up to and including the first
+    move that isn't in the database. As in rank_avg, a move outside the
+    top_k most played gets rank top_k + 1; rank is given for every ply after
+    the first (rank_avg only reports Black's, the odd plies).
+    """
+    with tree.snapshot():  # Both reads see the same state of the database
+        total_games_in_db = tree.get_total_games_in_db()
+        walks = tree.walk_prefixes(move_sequences)
+
+    progressions = []
+    for game, (move_sequence, walk) in enumerate(zip(move_sequences, walks), start=1):
+        metrics = []
+        previous_total = total_games_in_db
+        for ply, move in enumerate(move_sequence):
+            if ply >= len(walk):
+                metrics.append(PlyMetrics(game, ply, move, False, None, None, None, None, None,
+                                          None, None, top_k + 1 if ply > 0 else None))
+                break
+
+            node = walk[ply]
+            rank = None
+            if ply > 0:
+                rank = node.sibling_rank
+                if rank is None or rank > top_k:
+                    rank = top_k + 1
+            black_win_rate = node.black_win_count / node.total if node.total else 0.0
+            proportion = node.total / previous_total if previous_total > 0 else 0
+            metrics.append(PlyMetrics(game, ply, move, True, node.total, node.white_win_count,
+                                      node.black_win_count, node.draw_count, node.unfinished_count,
+                                      black_win_rate, proportion, rank))
+            previous_total = node.total
+        progressions.append(metrics)
+    return progressions
+
+
+def write_progressions(progressions: List[List[PlyMetrics]], output_file: str):
+    """Write all games' metrics as one CSV, one row per (game, ply)."""
+    with open(output_file, 'w', newline='') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(COLUMNS)
+        for metrics in progressions:
+            for row in metrics:
+                writer.writerow('' if value is None else int(value) if isinstance(value, bool) else value
+                                for value in row)
+
+
+def export_legacy(progressions: List[List[PlyMetrics]], move_sequences: Sequence[List[str]], output_dir: str):
+    """
+    Write the per-game files the single-metric scripts used to produce, so the
+    plotting scripts keep working: Black win rates, total games, proportions
+    and ranks of Black's moves (odd plies).
+    """
+    files = {
+        'winrate': open(os.path.join(output_dir, 'black_winrate_array_progression.txt'), 'w'),
+        'total': open(os.path.join(output_dir, 'V_total_games_count_progression.txt'), 'w'),
+        'proportion': open(os.path.join(output_dir, 'V_proportion_games_count_progression_black.txt'), 'w'),
+        'rank': open(os.path.join(output_dir, 'ranks_results.txt'), 'w'),
+    }
+    try:
+        for move_sequence, metrics in zip(move_sequences, progressions):
+            black = [row for row in metrics if row.ply % 2 != 0]
+            found = [row for row in black if row.found]
+            files['winrate'].write(" ".join(f"{row.black_win_rate:.2%}" for row in found) + "\n")
+            files['total'].write(" ".join(str(row.total_games) for row in found) + "\n")
+            files['proportion'].write(" ".join(f"{row.proportion:.4f}" for row in found) + "\n")
+            if move_sequence:  # rank_avg skips empty lines
+                files['rank'].write(" ".join(str(row.rank) for row in black) + "\n")
+    finally:
+        for file in files.values():
+            file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute every per-ply progression metric of a games file in one pass.")
+    parser.add_argument('input_file', nargs='?', default='move_sequences_cleaned.txt')
+    parser.add_argument('--db', default='chess_game_data.db')
+    parser.add_argument('--shards', nargs='+', metavar='DB', help="read the tree split over these shard databases")
+    parser.add_argument('--snapshot', help="read the tree from this tree_snapshot folder instead of the database")
+    parser.add_argument('--output', default='progression_metrics.csv')
+    parser.add_argument('--legacy-dir', help="also write the old per-metric text files into this folder")
+    parser.add_argument('--top-k', type=int, default=10, help="moves outside the top K get rank K + 1")
+    args = parser.parse_args()
+
+    with open(args.input_file, 'r') as infile:
+        move_sequences = [line.strip().split() for line in infile]
+
+    if args.snapshot:
+        tree = SnapshotDatabase(args.snapshot)
+    elif args.shards:
+        tree = FederatedTree(args.shards)
+    else:
+        tree = OpeningTree(args.db)
+    progressions = compute_progressions(tree, move_sequences, args.top_k)
+    write_progressions(progressions, args.output)
+    print(f"Metrics for {len(move_sequences)} games saved to {args.output}")
+    if args.legacy_dir:
+        export_legacy(progressions, move_sequences, args.legacy_dir)
+        print(f"Per-metric progression files saved to {args.legacy_dir}")
+    if isinstance(tree, OpeningTree):
+        print(f"Node cache: {tree.cache.stats()}")
+    if not args.snapshot:
+        tree.close()
+
+
+if __name__ == "__main__":
+    main()
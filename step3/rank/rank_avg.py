@@ -1,77 +1,62 @@
-import sqlite3
+import os
+import chess
 import matplotlib.pyplot as plt
 import signal
 import sys
-
-def get_move_rank(cursor, parent_id, gemini_move):
+from functools import partial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'step-2'))
+from opening_tree import OpeningTree
+from parallel_runner import run_games
+from positions import position_key
+
+class RankDatabase(OpeningTree):
+    def get_move_rank_by_board(self, board: chess.Board, gemini_move: str, top_k: int = 10) -> int:
+        """
+        Rank of Gemini's move among the legal moves of a position, by how many games
+        reached the resulting position by any move order (one Positions lookup per move).
+        """
+        totals = []
+        with self.snapshot() as conn:
+            for move in board.legal_moves:
+                san = board.san(move)
+                board.push(move)
+                row = conn.execute("SELECT total FROM Positions WHERE zobrist = ?", (position_key(board),)).fetchone()
+                board.pop()
+                if row:
+                    totals.append((row[0], san))
+        totals.sort(key=lambda entry: entry[0], reverse=True)
+
+        for rank, (total_games, move) in enumerate(totals[:top_k], start=1):
+            if move == gemini_move:
+                return rank
+        return top_k + 1  # Return top_k + 1 if the move is not in the top top_k
+
+def format_game_ranks(move_sequence, walk, total_games_in_db, top_k=10):
     """
-    Find the rank of Gemini's move among the top moves for a given parent position.
+    Ranks of Gemini's (Black's) moves in one game, from the sibling ranks along its walk
+    (Moves.sibling_rank); the first move not found gets top_k + 1 and ends the game.
     """
-    cursor.execute('''
-        SELECT id, move, white_win_count + black_win_count + draw_count + unfinished_count AS total_games
-        FROM Moves
-        WHERE parent_id = ?
-        ORDER BY total_games DESC
-        LIMIT 10
-    ''', (parent_id,))
-    moves = cursor.fetchall()
+    if not move_sequence:
+        return None  # Skip empty lines
 
-    for rank, (move_id, move, total_games) in enumerate(moves, start=1):
-        if move == gemini_move:
-            return rank
-    return 11  # Return 11 if the move is not in the top 10
+    ranks = []
+    for move_index in range(1, min(len(walk) + 1, len(move_sequence)), 2):
+        rank = walk[move_index].sibling_rank if move_index < len(walk) else None
+        ranks.append(str(rank if rank is not None and rank <= top_k else top_k + 1))
+    return " ".join(ranks)
 
-def analyze_gemini_moves_for_game(cursor, move_sequence, game_number):
-    """
-    Analyze the rank of each move made by Gemini (Black) in a single game sequence.
+def analyze_multiple_games_from_file(file_path, db_path='chess_game_data.db', rank_file='ranks_results.txt',
+                                     cache_size=None, top_k=10, workers=None):
     """
-    ranks = []  # Store ranks for this game
-    parent_id = None
-
-    for move_index, move in enumerate(move_sequence):
-        if move_index % 2 == 1:  # Gemini moves are on odd indices (Black's turn)
-            rank = get_move_rank(cursor, parent_id, move)
-            ranks.append(str(rank))  # Append rank as a string
-
-        # Update the parent_id to the current move's ID
-        cursor.execute("SELECT id FROM Moves WHERE move = ? AND parent_id IS ?", (move, parent_id))
-        result = cursor.fetchone()
-        if result:
-            parent_id = result[0]
-        else:
-            break  # Stop if no further moves can be processed
-
-    print(f"Processed Game {game_number}: Ranks - {ranks}")
-    return " ".join(ranks)  # Return space-separated ranks for this game
-
-def analyze_multiple_games_from_file(file_path, db_path='chess_game_data.db', rank_file='ranks_results.txt'):
+    Read multiple games from a file and analyze Gemini's move rankings, appending one line per game
+    to rank_file in input order. Games are spread over `workers` processes (default: one per core).
+    cache_size bounds the number of nodes each worker keeps in memory (see opening_tree.NodeCache);
+    moves outside the top_k most played get rank top_k + 1.
     """
-    Read multiple games from a file and analyze Gemini's move rankings.
-    """
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    # Open the output file in append mode
-    with open(rank_file, 'a') as rank_file_writer:
-        def save_progress(ranks):
-            """
-            Save the ranks for a single game.
-            """
-            rank_file_writer.write(ranks + "\n")
-            rank_file_writer.flush()  # Ensure the data is written immediately
-
-        # Process each game
-        with open(file_path, 'r') as file:
-            for game_number, line in enumerate(file, start=1):
-                move_sequence = line.strip().split()
-                if not move_sequence:
-                    continue  # Skip empty lines
-
-                print(f"Analyzing Game {game_number} with moves: {move_sequence}")
-                game_ranks = analyze_gemini_moves_for_game(cursor, move_sequence, game_number)
-                save_progress(game_ranks)  # Save ranks immediately after processing
-
-    conn.close()
+    run_games(file_path, rank_file, partial(format_game_ranks, top_k=top_k), db_path, workers,
+              cache_size=cache_size, append=True)
 
 def plot_ranks_from_file(rank_file):
     """
@@ -101,7 +86,7 @@ def plot_ranks_from_file(rank_file):
 
     # Plot the distribution of all ranks
     plt.figure(figsize=(10, 6))
-    plt.hist(all_ranks, bins=range(1, 13), edgecolor='black', align='left', rwidth=0.8, label='Rank Distribution')
+    plt.hist(all_ranks, bins=range(1, max(all_ranks) + 2), edgecolor='black', align='left', rwidth=0.8, label='Rank Distribution')
     plt.xlabel('Rank')
     plt.ylabel('Frequency')
     plt.title('Distribution of Gemini’s Move Ranks')
@@ -0,0 +1,188 @@
+import argparse
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from opening_tree import NodeStats
+
+# Snapshot layout: one .npy file per array, so np.load(mmap_mode='r') maps
+# each of them straight from the file. Node 0 is the (virtual) root; the
+# children of node i are nodes child_offsets[i] .. child_offsets[i + 1] - 1,
+# sorted by move code.
+ARRAYS = ('child_offsets', 'moves', 'node_ids', 'white_win_count', 'black_win_count',
+          'draw_count', 'unfinished_count', 'sibling_rank')
+MOVEDICT_FILE = 'movedict.tsv'
+META_FILE = 'meta.json'
+SNAPSHOT_FORMAT = 1
+
+FETCH_ROWS = 1000000
+
+
+def export_snapshot(db_path: str, snapshot_dir: str):
+    """Write the Moves tree of a database as a memory-mappable CSR snapshot."""
+    os.makedirs(snapshot_dir, exist_ok=True)
+    uri = f"file:{os.path.abspath(db_path)}?mode=ro"
+    with sqlite3.connect(uri, uri=True) as conn:
+        with open(os.path.join(snapshot_dir, MOVEDICT_FILE), 'w') as movedict:
+            for code, san in conn.execute("SELECT code, san FROM MoveDict ORDER BY code"):
+                movedict.write(f"{code}\t{san}\n")
+
+        # Sorted by (parent, move), the children of every node are contiguous
+        # and in move order; the unique index returns them that way (NULL first)
+        cursor = conn.execute("""
+            SELECT COALESCE(parent_id, 0), move, id, white_win_count, black_win_count,
+                   draw_count, unfinished_count, COALESCE(sibling_rank, 0)
+            FROM Moves INDEXED BY idx_moves_parent_move
+            ORDER BY parent_id, move
+        """)
+        chunks = []
+        while True:
+            rows = cursor.fetchmany(FETCH_ROWS)
+            if not rows:
+                break
+            chunks.append(np.array(rows, dtype=np.int64))
+        source_version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+    table = np.concatenate(chunks) if chunks else np.zeros((0, 8), dtype=np.int64)
+    parents, node_ids = table[:, 0], table[:, 2]
+
+    # Number the nodes breadth-first, so the children of consecutive nodes
+    # are consecutive too. The rows are sorted by parent id, which makes each
+    # node's children one run of rows, already in move order
+    order = []
+    offsets = []
+    frontier = np.zeros(1, dtype=np.int64)  # Moves ids of one level; 0 is the root
+    next_index = 1
+    while len(frontier):
+        starts = np.searchsorted(parents, frontier, side='left')
+        lengths = np.searchsorted(parents, frontier, side='right') - starts
+        first = np.cumsum(lengths) - lengths
+        offsets.append(next_index + first)
+        rows = np.arange(lengths.sum()) - np.repeat(first, lengths) + np.repeat(starts, lengths)
+        order.append(rows)
+        next_index += len(rows)
+        frontier = node_ids[rows]
+    child_offsets = np.concatenate(offsets + [[next_index]])
+    rows = np.concatenate(order)
+    node_count = next_index
+
+    def column(index, dtype=np.int64):
+        return np.concatenate(([0], table[rows, index])).astype(dtype)
+
+    arrays = {
+        'child_offsets': child_offsets,
+        'moves': column(1, np.int32),
+        'node_ids': column(2),
+        'white_win_count': column(3),
+        'black_win_count': column(4),
+        'draw_count': column(5),
+        'unfinished_count': column(6),
+        'sibling_rank': column(7, np.int32),
+    }
+    # The root's counts are the sum over the first moves
+    first_moves = slice(child_offsets[0], child_offsets[1])
+    for name in ('white_win_count', 'black_win_count', 'draw_count', 'unfinished_count'):
+        arrays[name][0] = arrays[name][first_moves].sum()
+
+    for name in ARRAYS:
+        np.save(os.path.join(snapshot_dir, f"{name}.npy"), arrays[name])
+    with open(os.path.join(snapshot_dir, META_FILE), 'w') as meta:
+        json.dump({'format': SNAPSHOT_FORMAT, 'source': os.path.abspath(db_path),
+                   'schema_version': source_version, 'nodes': node_count}, meta)
+    return node_count
+
+
+class SnapshotDatabase:
+    """
+    Read API of ChessDatabase/OpeningTree over an exported snapshot instead
+    of SQLite. The arrays are memory-mapped, so opening is instant and every
+    process reading the same snapshot shares one copy in the OS page cache.
+    A move is found by binary search among its parent's children.
+    """
+
+    def __init__(self, snapshot_dir: str):
+        with open(os.path.join(snapshot_dir, META_FILE)) as meta:
+            self.meta = json.load(meta)
+        if self.meta['format'] != SNAPSHOT_FORMAT:
+            raise ValueError(f"{snapshot_dir}: unsupported snapshot format {self.meta['format']}")
+        for name in ARRAYS:
+            # Plain ndarray views of the maps: np.memmap slices are much slower to make
+            mapped = np.load(os.path.join(snapshot_dir, f"{name}.npy"), mmap_mode='r')
+            setattr(self, name, mapped.view(np.ndarray))
+        self.codes: Dict[str, int] = {}
+        with open(os.path.join(snapshot_dir, MOVEDICT_FILE)) as movedict:
+            for line in movedict:
+                code, san = line.rstrip('\n').split('\t')
+                self.codes[san] = int(code)
+
+    @contextmanager
+    def snapshot(self):
+        """For compatibility with OpeningTree.snapshot(); an exported snapshot never changes."""
+        yield None
+
+    def find_child(self, node: int, move: str) -> Optional[int]:
+        """Snapshot index of a move below node (0 for first moves), or None."""
+        code = self.codes.get(move)
+        if code is None:
+            return None
+        start, end = int(self.child_offsets[node]), int(self.child_offsets[node + 1])
+        index = start + int(np.searchsorted(self.moves[start:end], code))
+        if index < end and self.moves[index] == code:
+            return index
+        return None
+
+    def node_stats(self, node: int) -> NodeStats:
+        return NodeStats(int(self.node_ids[node]), int(self.white_win_count[node]), int(self.black_win_count[node]),
+                         int(self.draw_count[node]), int(self.unfinished_count[node]),
+                         int(self.sibling_rank[node]) or None)
+
+    def walk(self, move_sequence: List[str]) -> List[int]:
+        """Snapshot indexes along a move sequence, up to the first move not found."""
+        nodes = []
+        node = 0
+        for move in move_sequence:
+            node = self.find_child(node, move)
+            if node is None:
+                break
+            nodes.append(node)
+        return nodes
+
+    def walk_prefixes(self, sequences: Sequence[List[str]]) -> List[List[NodeStats]]:
+        """Same result as OpeningTree.walk_prefixes."""
+        return [[self.node_stats(node) for node in self.walk(sequence)] for sequence in sequences]
+
+    def get_total_games_in_db(self) -> int:
+        return int(self.white_win_count[0] + self.black_win_count[0] + self.draw_count[0]
+                   + self.unfinished_count[0])
+
+    def get_statistics(self, move_sequence: List[str]) -> Optional[dict]:
+        """Get cumulative statistics for a move sequence, like ChessDatabase.get_statistics."""
+        nodes = self.walk(move_sequence)
+        if len(nodes) < len(move_sequence) or not nodes:
+            print(f"Move not found: {move_sequence}")
+            return None
+
+        stats = self.node_stats(nodes[-1])
+        return {
+            'white_win_rate': stats.white_win_count,
+            'black_win_rate': stats.black_win_count,
+            'draw_rate': stats.draw_count,
+            'unfinished_rate': stats.unfinished_count,
+            'total_games': stats.total
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the Moves tree as a memory-mapped array snapshot.")
+    parser.add_argument('db_path', nargs='?', default='chess_game_data.db')
+    parser.add_argument('snapshot_dir', nargs='?', default='tree_snapshot')
+    args = parser.parse_args()
+
+    nodes = export_snapshot(args.db_path, args.snapshot_dir)
+    print(f"Wrote {nodes} nodes to {args.snapshot_dir}")
+
+
+if __name__ == "__main__":
+    main()
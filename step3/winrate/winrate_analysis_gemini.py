@@ -1,63 +1,48 @@
-import sqlite3
+import os
+import sys
 from typing import List, Optional
+import chess
 
-class ChessDatabase:
-    def __init__(self, db_path: str):
-        self.db_path = db_path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'step-2'))
+from opening_tree import OpeningTree, NodeStats
+from parallel_runner import run_games
+from positions import position_key
 
-    def get_black_win_rate(self, move_sequence: List[str]) -> Optional[float]:
-        """Get cumulative Black win rate for a move sequence."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            parent_id = None
-
-            for move in move_sequence:
-                cursor.execute("""
-                    SELECT id, black_win_count, white_win_count, draw_count, unfinished_count
-                    FROM Moves 
-                    WHERE move = ? AND parent_id IS ?
-                """, (move, parent_id))
-
-                row = cursor.fetchone()
-                if not row:
-                    print(f"Move not found in DB for sequence: {' '.join(move_sequence)}")
-                    return None  # Stop if any move is not found in the database
 
-                parent_id = row[0]  # Move to the next move's parent ID
-            
-            total_games = sum(row[1:])
-            if total_games == 0:
-                print("No games found for the final sequence")
-                return 0.0  # No games found, return 0% win rate
+def black_win_rate(node: NodeStats) -> float:
+    """Black win rate of a node; 0% if no games reached it."""
+    return node.black_win_count / node.total if node.total else 0.0
 
-            black_win_rate = row[1] / total_games  # Calculate Black win rate
-            return black_win_rate
 
-def process_move_sequences(input_file: str, output_file: str, db: ChessDatabase):
+class ChessDatabase(OpeningTree):
+    def get_black_win_rate(self, move_sequence: List[str]) -> Optional[float]:
+        """Get cumulative Black win rate for a move sequence."""
+        walk = self.walk_prefixes([move_sequence])[0]
+        if len(walk) < len(move_sequence):
+            print(f"Move not found in DB for sequence: {' '.join(move_sequence)}")
+            return None  # Stop if any move is not found in the database
+        return black_win_rate(walk[-1]) if walk else 0.0
+
+    def get_black_win_rate_by_board(self, board: chess.Board) -> Optional[float]:
+        """Get Black win rate for a position, over every move order that reaches it."""
+        with self.snapshot() as conn:
+            row = conn.execute("""
+                SELECT black_win_count, total FROM Positions WHERE zobrist = ?
+            """, (position_key(board),)).fetchone()
+        if not row:
+            return None
+        return row[0] / row[1] if row[1] else 0.0
+
+def format_game(move_sequence: List[str], walk: List[NodeStats], total_games_in_db: int) -> str:
+    """Black win rates of one game as space-separated values."""
+    # Only keep the stats after Black's moves (odd indices), up to the first move not found
+    black_win_rates = [f"{black_win_rate(node):.2%}" for i, node in enumerate(walk) if i % 2 != 0]
+    return " ".join(black_win_rates)
+
+def process_move_sequences(input_file: str, output_file: str, db: ChessDatabase, workers: Optional[int] = None):
     """Process each move sequence from an input file and save only Black win rates as space-separated values in the output file."""
-    with open(input_file, 'r') as infile, open(output_file, 'w') as outfile:
-        for game_number, line in enumerate(infile, start=1):
-            move_sequence = line.strip().split()
-            cumulative_moves = []
-            black_win_rates = []  # Array to store black win rates for this game
-            
-            print(f"\nProcessing Game {game_number} with move sequence: {line.strip()}")
-            
-            for i, move in enumerate(move_sequence):
-                cumulative_moves.append(move)
-                
-                # Only fetch stats after Black's moves (odd indices)
-                if i % 2 != 0:  # i is odd for Black moves in the sequence
-                    black_win_rate = db.get_black_win_rate(cumulative_moves)
-                    if black_win_rate is None:
-                        # If move not found, stop further processing for this game
-                        cumulative_moves.pop()  # Remove the move that wasn't found
-                        break
-                    black_win_rates.append(f"{black_win_rate:.2%}")
-
-            # Write only the Black win rates as space-separated values to the output file
-            outfile.write(" ".join(black_win_rates) + "\n")
-            print(f"Written Game {game_number} results to output file")
+    run_games(input_file, output_file, format_game, db.db_path, workers)
 
 def main():
     db = ChessDatabase('chess_game_data.db')